@@ -0,0 +1,81 @@
+"""
+Compares the msgpack message schema against the legacy JSON messages.
+
+$ python -m benchmarks.rabbitmq_codec
+"""
+import json
+import timeit
+from games.rabbimq.codec import encode_message, decode_message, \
+    GAME_DATA, RANKING_REQUEST, USER_DATA
+
+REPEAT = 20000
+
+
+def game_data(players):
+    return {
+        'game_type': 'makao',
+        'players': {
+            str(1000 + i): {
+                'points': 12 - i,
+                'score': 'win' if i == 0 else 'lose',
+                'left': False,
+                'moves': 25 + i,
+                'time_sec': 100 + i,
+            } for i in range(players)
+        }
+    }
+
+
+def ranking_request(players):
+    return {
+        'game_type': 'makao',
+        'game_id': 'g1a2b3c4d',
+        'players': [1000 + i for i in range(players)],
+    }
+
+
+def user_data(players):
+    return {
+        'game_name': 'makao',
+        'game_id': 'g1a2b3c4d',
+        'players': {
+            str(1000 + i): {
+                'nickname': f'player_{i}',
+                'rank': 1200 + i,
+            } for i in range(players)
+        }
+    }
+
+
+MESSAGES = [
+    ('game data', GAME_DATA, game_data),
+    ('ranking request', RANKING_REQUEST, ranking_request),
+    ('user data', USER_DATA, user_data),
+]
+
+
+def bench(jsonbody, kind, message_format):
+    body, content_type = encode_message(jsonbody, kind, message_format)
+    assert decode_message(body, content_type) == json.loads(
+        json.dumps(jsonbody))
+    encode = timeit.timeit(
+        lambda: encode_message(jsonbody, kind, message_format), number=REPEAT)
+    decode = timeit.timeit(
+        lambda: decode_message(body, content_type), number=REPEAT)
+    return len(body), encode / REPEAT * 1e6, decode / REPEAT * 1e6
+
+
+def main():
+    print(f'{"message":<22}{"format":<9}{"bytes":>7}'
+          f'{"encode us":>11}{"decode us":>11}')
+    for name, kind, factory in MESSAGES:
+        for players in (2, 4):
+            jsonbody = factory(players)
+            for message_format in ('json', 'msgpack'):
+                size, encode, decode = bench(jsonbody, kind, message_format)
+                print(f'{name + f" x{players}":<22}{message_format:<9}'
+                      f'{size:>7}{encode:>11.2f}{decode:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
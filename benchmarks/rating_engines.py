@@ -0,0 +1,37 @@
+"""
+Rating updates per second of every rating engine for 2-4 player tables,
+against the per-player calculate_elo loop.
+
+$ python -m benchmarks.rating_engines
+"""
+import timeit
+import numpy as np
+from games.ranking import ENGINES, ELO_K, calculate_elo
+
+REPEAT = 5000
+
+
+def pairwise_elo(ratings, scores):
+    return [calculate_elo(rating, ratings[:i] + ratings[i + 1:], score, ELO_K)
+            for i, (rating, score) in enumerate(zip(ratings, scores))]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f'{"engine":<16}{"players":>8}{"tables/s":>12}{"updates/s":>12}')
+    for players in (2, 3, 4):
+        scores = [1] + [0] * (players - 1)
+        ratings = [float(r) for r in rng.normal(1000, 200, players)]
+        seconds = timeit.timeit(lambda: pairwise_elo(ratings, scores), number=REPEAT)
+        print(f'{"calculate_elo":<16}{players:>8}{REPEAT / seconds:>12.0f}'
+              f'{REPEAT * players / seconds:>12.0f}')
+        for name, engine_class in ENGINES.items():
+            engine = engine_class()
+            states = np.array([engine.state(rating) for rating in ratings])
+            seconds = timeit.timeit(lambda: engine.update(states, scores), number=REPEAT)
+            print(f'{name:<16}{players:>8}{REPEAT / seconds:>12.0f}'
+                  f'{REPEAT * players / seconds:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
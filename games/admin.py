@@ -1,6 +1,6 @@
 from django.contrib import admin
 from nested_inline.admin import NestedStackedInline, NestedModelAdmin
-from .models import GameType, Game, Participation, Move
+from .models import GameType, Game, Participation, Move, PlayerStats
 
 
 class MoveInLine(NestedStackedInline):
@@ -30,4 +30,5 @@ admin.site.register(GameType)
 admin.site.register(Game, GameAdmin)
 admin.site.register(Participation)
 admin.site.register(Move)
+admin.site.register(PlayerStats)
 # Register your models here.
@@ -1,4 +1,4 @@
-import random
+from array import array
 cards_prefix = [
     '2', '3', '4', '5', '6', '7', '8',
     '9', '0', 'J', 'Q', 'K', 'A'
@@ -14,14 +14,87 @@ def get_cards_deck():
     return cards
 
 
-def get_random_card(card_deck):
-    return random.choice(card_deck)
+# Cards inside the rules are ints: rank * 4 + suit, rank = index in
+# cards_prefix (2 lowest, ace highest), suit = index in packing_symbols.
+# Strings like '0H' are only used at the wire boundary: the room JSON,
+# websocket messages and records.
+# fixed order used for packing, cards_symbols is an unordered set
+packing_symbols = sorted(cards_symbols)
+DECK_SIZE = len(cards_prefix) * len(packing_symbols)
+FULL_DECK_MASK = (1 << DECK_SIZE) - 1
 
+CARD_STRINGS = [prefix + symbol
+                for prefix in cards_prefix for symbol in packing_symbols]
+CARD_CODES = {card: code for code, card in enumerate(CARD_STRINGS)}
+# RANKS[code] = rank, compared instead of searching cards_prefix
+RANKS = bytes(code // len(packing_symbols) for code in range(DECK_SIZE))
+
+
+def card_code(card):
+    return CARD_CODES[card]
+
+
+def card_from_code(code):
+    return CARD_STRINGS[code]
+
+
+def card_rank(code):
+    return RANKS[code]
+
+
+def card_suit(code):
+    return code % len(packing_symbols)
+
+
+def compare_ranks(code1, code2):
+    """
+    1 if code1 ranks higher, -1 if lower, 0 for the same rank
+    """
+    return (RANKS[code1] > RANKS[code2]) - (RANKS[code1] < RANKS[code2])
+
+
+def new_deck():
+    return array('B', range(DECK_SIZE))
+
+
+def shuffled_deck(rng):
+    """
+    Fisher-Yates shuffle of new_deck() with rng = random.Random(seed),
+    the same seed gives the same deck. Cards are drawn from the end: deck.pop()
+    """
+    deck = new_deck()
+    for i in range(len(deck) - 1, 0, -1):
+        j = rng.randrange(i + 1)
+        deck[i], deck[j] = deck[j], deck[i]
+    return deck
+
+
+def to_codes(cards):
+    """
+    ['0H', 'QS'] -> array('B', [34, 43])
+    """
+    return array('B', [CARD_CODES[card] for card in cards])
+
+
+def to_strings(codes):
+    return [CARD_STRINGS[code] for code in codes]
+
+
+def cards_mask(codes):
+    """
+    set of cards as a 52 bit int, bit = card code
+    """
+    mask = 0
+    for code in codes:
+        mask |= 1 << code
+    return mask
+
+
+def mask_codes(mask):
+    codes = array('B')
+    while mask:
+        low = mask & -mask
+        codes.append(low.bit_length() - 1)
+        mask ^= low
+    return codes
 
-def get_random_hand(card_deck, number_of_cards):
-    cards = []
-    for _ in range(number_of_cards):
-        card = get_random_card(card_deck)
-        card_deck.remove(card)
-        cards.append(card)
-    return card_deck, cards
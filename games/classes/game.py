@@ -1,29 +1,39 @@
 from abc import ABC, abstractmethod
 import secrets
-import json
-import random
 import time
 import math
-from ..models import GameType, Participation
-from .cards_utils import get_cards_deck, get_random_hand
+import base64
+from collections import Counter
+import numpy as np
+from django.conf import settings
+from ..models import Participation
+from .cards_utils import CARD_CODES, card_from_code, to_strings
 from ..redis_utils import redis
-from ..ranking import calculate_elo
+from ..ranking import get_engine
+from ..write_behind import enqueue, FINISH, RATINGS
+from ..move_log import encode_move, pack_moves
+from ..leaderboard import set_rating, set_rating_params, rating_params
+from ..engine.state import WAITING, ONGOING, FINISHED, deal
+from ..engine.store import load_state, save_state, legal_moves, cached_moves, \
+    state_version, bump_version
+from ..registry import get_config
 
 HASH_GAME_LEN = 4
-WAITING = 'waiting'
-ONGOING = 'ongoing'
-FINISHED = 'finished'
 MAX_TIMEOUT = 30
 INACTIVE_PINGS_DISC = 5
+START_RECORD_VERSION = 2
 
 
 class Game(ABC):
+    # games.engine.state.GameState subclass with the rules
+    state_class = None
+    # lobby parameters JSON, relative to the class's module; None for the
+    # games bundled in games/games_configs/<name>.json
+    config_path = None
+
     @classmethod
     def get_config_json(cls):
-        with open(f'games/games_configs/{cls.__name__}.json', 'r') as jsonFile:
-            jsonObject = json.load(jsonFile)
-            jsonFile.close()
-        return jsonObject
+        return get_config(cls.__name__.lower()).source
 
     @classmethod
     def path_to_game(cls, game_id):
@@ -39,6 +49,9 @@ class Game(ABC):
 
         user_json['players'] = {}
         user_json['status'] = 'waiting'
+        # set by start_game, see engine.store
+        user_json['seed'] = None
+        user_json['version'] = 0
         # user_json['id'] = id
 
         # Create redis instance games: {type_game: {}} if does not exist
@@ -57,41 +70,10 @@ class Game(ABC):
 
     @classmethod
     def check_create_game(cls, user_json) -> bool:
-        config_json = cls.get_config_json()
-        for k in config_json.keys():
-            if k != 'game_params':
-                cls.check_param(
-                    user_json['game_parameters'][k], config_json[k])
-
-        for elem in config_json['game_params']:
-            k = elem['param_name']
-            cls.check_param(user_json['game_parameters']
-                            [k], elem['param_setup'])
+        config = get_config(cls.__name__.lower())
+        user_json['game_parameters'] = config.validate(user_json['game_parameters'])
         return True
 
-    def check_param(user_value, config_param):
-        param_type = config_param['type']
-        if param_type == 'int':
-            user_value = int(user_value)
-            if user_value >= config_param['min'] and user_value <= config_param['max']:
-                return True
-        elif param_type == 'bool':
-            user_value = bool(user_value)
-            return True
-        elif param_type == 'time':
-            def get_seconds(time):
-                multipier = 1
-                seconds = 0
-                for el in time.split(':')[::-1]:
-                    seconds += int(el) * multipier
-                    multipier *= 60
-                return seconds
-            if get_seconds(config_param['min']) <= user_value <= get_seconds(config_param['max']):
-                return True
-        else:
-            raise Exception('Parameter type has no implemented checking')
-        raise Exception(f'{param_type} parameter is incorrect')
-
     @classmethod
     def delete_game(cls, game_id):
         game = cls.path_to_game(game_id)
@@ -303,11 +285,15 @@ class Game(ABC):
     def start_game(cls, game_id):
         game = cls.path_to_game(game_id)
         redis.jsonset('games', f'.{game}.status', ONGOING)
-        card_deck = get_cards_deck()
-        for player in redis.jsonget('games', f'.{game}.players'):
-            card_deck, cards = get_random_hand(card_deck, redis.jsonget(
-                'games', f'.{game}.game_parameters.cards_on_hand'))
-            redis.jsonset('games', f'.{game}.players.{player}.hand', cards)
+        # the deck is shuffled once, dealing and drawing pop from its end
+        seed = secrets.randbits(63)
+        hands, card_deck, starting_player = deal(
+            list(redis.jsonget('games', f'.{game}.players')),
+            redis.jsonget('games', f'.{game}.game_parameters.cards_on_hand'),
+            seed)
+        for player, cards in hands.items():
+            redis.jsonset('games', f'.{game}.players.{player}.hand',
+                          to_strings(cards))
             u_time = redis.jsonget('games',
                                    f'.{game}.game_parameters.time_per_player')
             redis.jsonset('games', f'.{game}.players.{player}.time', u_time)
@@ -315,13 +301,13 @@ class Game(ABC):
             redis.jsonset('games', f'.{game}.players.{player}.timeout',
                           MAX_TIMEOUT)
 
-        starting_player = random.choice(
-            list(redis.jsonget('games', f'.{game}.players').keys()))
         redis.jsonset('games', f'.{game}.starting_player', starting_player)
         redis.jsonset('games', f'.{game}.current_player', starting_player)
 
-        redis.jsonset('games', f'.{game}.stack_draw', card_deck)
+        redis.jsonset('games', f'.{game}.seed', seed)
+        redis.jsonset('games', f'.{game}.stack_draw', to_strings(card_deck))
         redis.jsonset('games', f'.{game}.stack_throw', [])
+        redis.jsonset('games', f'.{game}.move_log', [])
         redis.jsonset('games', f'.{game}.move_time', time.time())
         redis.jsonset('games', f'.{game}.end_by_timeout', False)
         redis.jsonset('games', f'.{game}.surrender', False)
@@ -331,6 +317,7 @@ class Game(ABC):
         redis.jsonset('games', f'.{game}.state_to_send', False)
         redis.jsonset('games', f'.{game}.scores', {
                       'win': [], 'lose': []})
+        bump_version(redis, game)
 
     @classmethod
     def game_state(cls, game_id):
@@ -372,6 +359,67 @@ class Game(ABC):
         print(info)
         return info
 
+    @classmethod
+    def start_record(cls, game_id):
+        """
+        Compact record of a just started game, stored in Game.start_state.
+        Hands and deck are dealt again from the seed
+        {
+            'v': 2,
+            'game_id': 'g1a2b3c4d',
+            'params': {game_parameters},
+            'seats': [['p1', user_id], ...],
+            'starting_player': 'p1',
+            'seed': seed,
+        }
+        """
+        game = cls.path_to_game(game_id)
+        room = redis.jsonget('games', f'.{game}')
+        seats = []
+        for chair, values in room['players'].items():
+            seats.append([chair, values['id']])
+        return {
+            'v': START_RECORD_VERSION,
+            'game_id': game_id,
+            'params': room['game_parameters'],
+            'seats': seats,
+            'starting_player': room['starting_player'],
+            'seed': room['seed'],
+        }
+
+    @classmethod
+    def initial_state(cls, record):
+        """
+        Rebuilds the game part of the room as it was right after start_game
+        """
+        if 'v' not in record:
+            # games stored before start records held the whole room
+            return record
+        params = record['params']
+        hands, stack_draw, _ = deal([chair for chair, _ in record['seats']],
+                                    params['cards_on_hand'], record['seed'])
+        players = {}
+        for chair, user_id in record['seats']:
+            players[chair] = {
+                'id': user_id,
+                'hand': to_strings(hands[chair]),
+                'time': params['time_per_player'],
+                'points': 0,
+                'timeout': MAX_TIMEOUT,
+            }
+        return {
+            'game_parameters': params,
+            'status': ONGOING,
+            'players': players,
+            'starting_player': record['starting_player'],
+            'current_player': record['starting_player'],
+            'stack_draw': to_strings(stack_draw),
+            'stack_throw': [],
+            'end_by_timeout': False,
+            'surrender': False,
+            'is_draw': False,
+        }
+
     @classmethod
     def get_next_player(cls, game_id):
         game = cls.path_to_game(game_id)
@@ -418,6 +466,7 @@ class Game(ABC):
                     win_nickname = cls.get_nicknameshow_by_nickname(game_id, p)
                     redis.jsonarrappend('games', f'.{game}.scores.win', win_nickname)
             redis.jsonset('games', f'.{game}.status', FINISHED)
+            bump_version(redis, game)
             redis.jsonset('games', f'.{game}.any_update_in_game', True)
             redis.jsonset('games', f'.{game}.scores_to_users', True)
             redis.jsonset('games', f'.{game}.state_to_send', True)
@@ -450,12 +499,14 @@ class Game(ABC):
             win = Participation.ScoreTypes.WIN
             lose = Participation.ScoreTypes.LOSE
 
-        modeltype = GameType.objects.get_typegame_lower_nospecial(
-            cls.__name__.lower())
-
+        max_time = redis.jsonget(
+            'games', f'.{game}.game_parameters.time_per_player')
+        scores = {}
+        times = {}
         for p in cls.get_all_players(game_id):
             user_id = cls.get_id_from_nickname(game_id, p)
             nick = cls.get_nicknameshow_by_nickname(game_id, p)
+            chair = cls.get_user_chair(game_id, p)
             if redis.jsonget('games', f'.{game}.is_draw'):
                 score = draw
             elif nick in redis.jsonget('games', f'.{game}.scores.win'):
@@ -463,14 +514,28 @@ class Game(ABC):
             elif nick in redis.jsonget('games', f'.{game}.scores.lose'):
                 score = lose
 
-            Participation.objects.get_by_userid_gametype(
-                user_id, modeltype).update(score=score)
+            scores[user_id] = score
+            times[user_id] = int(max_time - redis.jsonget(
+                'games', f'.{game}.players.{chair}.time'))
+
+        move_log = pack_moves(redis.jsonget('games', f'.{game}.move_log'))
+        enqueue(cls.__name__.lower(), game_id, FINISH, flush=True,
+                scores=scores, times=times,
+                move_log=base64.b64encode(move_log).decode())
+
+    @classmethod
+    def log_move(cls, game_id, user, action, move):
+        game = cls.path_to_game(game_id)
+        chair = cls.get_user_chair(game_id, user)
+        redis.jsonarrappend('games', f'.{game}.move_log',
+                            encode_move(chair, action, move))
 
     @classmethod
     def draw_game(cls, game_id):
         game = cls.path_to_game(game_id)
         redis.jsonset('games', f'.{game}.is_draw', True)
         redis.jsonset('games', f'.{game}.status', FINISHED)
+        bump_version(redis, game)
         cls.update_db_after_finish(game_id)
 
     @classmethod
@@ -502,36 +567,60 @@ class Game(ABC):
         return redis.jsonget('games', f'.{game}.game_parameters.is_ranked')
 
     @classmethod
-    def get_user_score(cls, game_id, nickname, scoretype):
-        game = cls.path_to_game(game_id)
-        info = {}
-        max_time = redis.jsonget(
-            'games', f'.{game}.game_parameters.time_per_player')
-        chair = cls.get_user_chair(game_id, nickname)
-        # points = ranking
-        user_ranking = redis.jsonget('games', f'.{game}.players.{chair}.ranking')
-        rankings = cls.get_all_rankings(game_id)
-        idx = rankings.index(user_ranking)
-        rankings.pop(idx)
-        score = cls.get_score_from_scoretype(scoretype)
-        k = 100
-        info['points'] = int(calculate_elo(user_ranking, rankings, score, k)) - user_ranking
-        info['score'] = scoretype
-        info['left'] = False
-        info['moves'] = 0
-        info['time_sec'] = int(max_time -
-                               redis.jsonget('games', f'.{game}.players.{chair}.time'))
-        if nickname == cls.get_timeouted_user(game_id):
-            info['left'] = True
-        return info
-
-    @classmethod
-    def get_all_rankings(cls, game_id):
+    def get_users_scores(cls, game_id):
+        """
+        Scores of all players of a finished game from one room read
+        return ({user_id: {points, score, left, moves, time_sec}},
+                {user_id: rating engine params})
+        """
         game = cls.path_to_game(game_id)
-        rankings = []
-        for chair in redis.jsonget('games', f'.{game}.players').keys():
-            rankings.append(redis.jsonget('games', f'.{game}.players.{chair}.ranking'))
-        return rankings
+        room = redis.jsonget('games', f'.{game}')
+        max_time = room['game_parameters']['time_per_player']
+        players = room['players']
+
+        chairs = []
+        scoretypes = []
+        for chair, values in players.items():
+            if room['is_draw']:
+                scoretype = 'draw'
+            elif values['nickname_show'] in room['scores']['win']:
+                scoretype = 'win'
+            elif values['nickname_show'] in room['scores']['lose']:
+                scoretype = 'lose'
+            else:
+                continue
+            chairs.append(chair)
+            scoretypes.append(scoretype)
+
+        engine = get_engine(settings.RATING_ENGINE)
+        ids = [players[chair]['id'] for chair in chairs]
+        ratings = [players[chair]['ranking'] for chair in chairs]
+        states = np.array([
+            engine.state(rating, params) for rating, params in zip(
+                ratings, rating_params(cls.__name__.lower(), ids))
+        ]).reshape(len(chairs), len(engine.FIELDS))
+        # points = ranking change
+        new_states = engine.update(
+            states,
+            [cls.get_score_from_scoretype(scoretype) for scoretype in scoretypes])
+        timeouted = next((chair for chair, values in players.items()
+                          if values['timeout'] <= 0), None)
+        moves = Counter('p' + str(seat + 1)
+                        for seat, _, _ in room.get('move_log', []))
+
+        scores = {}
+        params = {}
+        for id, chair, scoretype, rating, new_state in zip(
+                ids, chairs, scoretypes, ratings, new_states):
+            scores[id] = {
+                'points': int(new_state[0]) - rating,
+                'score': scoretype,
+                'left': chair == timeouted,
+                'moves': moves[chair],
+                'time_sec': int(max_time - players[chair]['time']),
+            }
+            params[id] = engine.params(new_state)
+        return scores, params
 
     @classmethod
     def was_scores_sent(cls, game_id):
@@ -553,15 +642,24 @@ class Game(ABC):
         redis.jsonset('games', f'.{game}.scores_to_rabbit', val)
         
     @classmethod
-    def update_rankings(cls, game_id, jsondata):
+    def update_rankings(cls, game_id, jsondata, params=None):
+        """
+        params = {user_id: rating engine params} from get_users_scores
+        """
         game = cls.path_to_game(game_id)
+        ratings = {}
         for id in jsondata['players']:
             nickname = cls.get_nickname_from_id(game_id, id)
             chair = cls.get_user_chair(game_id, nickname)
             rank = jsondata['players'][id]['points']
-            redis.jsonnumincrby('games', f'.{game}.players.{chair}.ranking', rank)
-            print(redis.jsonget('games', f'.{game}.players.{chair}.ranking'))
+            ratings[id] = redis.jsonnumincrby(
+                'games', f'.{game}.players.{chair}.ranking', rank)
+            set_rating(cls.__name__.lower(), id, ratings[id],
+                       cls.get_nicknameshow_by_nickname(game_id, nickname))
         redis.jsonset('games', f'.{game}.any_update_in_game', True)
+        set_rating_params(cls.__name__.lower(), params)
+        enqueue(cls.__name__.lower(), game_id, RATINGS,
+                ratings=ratings, params=params or {})
 
     @classmethod
     def any_update_in_game(cls, game_id):
@@ -582,6 +680,7 @@ class Game(ABC):
     def set_status_waiting(cls, game_id):
         game = cls.path_to_game(game_id)
         redis.jsonset('games', f'.{game}.status', WAITING)
+        bump_version(redis, game)
         for p in redis.jsonget('games', f'.{game}.players'):
             redis.jsonset('games', f'.{game}.players.{p}.ready', False)
 
@@ -676,10 +775,27 @@ class Game(ABC):
             cls.finish_game_by_undertime(game_id)
 
     @classmethod
-    def make_move(cls, game_id, user, action, move):
+    def make_move(cls, game_id, user, action, move=None):
+        # stale, out of turn and illegal moves are rejected before any
+        # write, from the legal moves cached for the room version
+        # moves come from the websocket as any JSON value
+        if move and (not isinstance(move, str) or move not in CARD_CODES):
+            return False
+        code = CARD_CODES[move] if move else None
+        version, moves = cached_moves(cls, game_id, user)
+        if (action, code) not in moves:
+            return False
         game = cls.path_to_game(game_id)
         redis.jsonset('games', f'.{game}.state_to_send', True)
+        # may finish the game, apply then rejects the move
         cls.check_timers(game_id)
+        state = load_state(cls, game_id)
+        # validated above unless the room changed since
+        if not state.apply(state.chair(user), action, code,
+                           trusted=state_version(state) == version):
+            return False
+        save_state(cls, game_id, state)
+        return True
 
     @classmethod
     def is_game_drew(cls, game_id):
@@ -687,9 +803,8 @@ class Game(ABC):
         return redis.jsonget('games', f'.{game}.is_draw')
 
     @classmethod
-    @abstractmethod
     def is_game_finished(cls, game_id):
-        pass
+        return load_state(cls, game_id).is_finished()
 
     @classmethod
     @abstractmethod
@@ -711,6 +826,10 @@ class Game(ABC):
         pass
 
     @classmethod
-    @abstractmethod
-    def possible_moves(cls, game_id):
-        pass
+    def possible_moves(cls, game_id, user):
+        moves = legal_moves(cls, game_id, user)
+        return {
+            'possible_actions': list(dict.fromkeys(action for action, _ in moves)),
+            'possible_moves': [card_from_code(move) for _, move in moves
+                               if move is not None],
+        }
@@ -1,18 +1,11 @@
 import json
+import time
+from django.conf import settings
 from django.utils.functional import partition
-from .makao import Makao
-from .war import War
-from ..models import GameType, Game, Participation, Move
 from asgiref.sync import async_to_sync
 from ..rabbimq.sender import send_ranking_request, send_game_data
-
-
-def get_class(game_type):
-    if game_type == 'war':
-        return War
-    elif game_type == 'makao':
-        return Makao
-    raise Exception('Gametype does not exist')
+from ..write_behind import enqueue, START_GAME, MOVE
+from ..registry import get_class
 
 
 def create_game(game_type, user_json):
@@ -67,14 +60,9 @@ def start_game(game_type, game_id):
     game_class = get_class(game_type)
     game_class.start_game(game_id)
 
-    info = game_class.debug_info(game_id)
-    info['game_id'] = game_id
-    modeltype = GameType.objects.get_typegame_lower_nospecial(game_type)
-    modelgame = Game.objects.create(game_type=modeltype, start_state=info)
-    for player_id in game_class.get_players_ids(game_id):
-        Participation.objects.create(user=player_id,
-                                     game=modelgame,
-                                     score=Participation.ScoreTypes.IN_PROGRESS)
+    enqueue(game_type, game_id, START_GAME,
+            start_state=game_class.start_record(game_id),
+            players=game_class.get_players_ids(game_id))
 
 
 def game_info(game_type, game_id):
@@ -145,16 +133,14 @@ def start_counting_timeout(game_type, game_id, user):
 
 def make_move(game_type, game_id, user, action, move):
     game_class = get_class(game_type)
-    id = game_class.get_id_from_nickname(game_id, user)
-
-    if game_class.make_move(game_id, user, action, move):
-        if move is None:
-            move = ''
-        modeltype = GameType.objects.get_typegame_lower_nospecial(game_type)
-        modelpartic = Participation.objects.get_by_userid_gametype(
-            id, modeltype).last()
-        Move.objects.create(participation=modelpartic,
-                            action=action, move=move)
+    if not game_class.make_move(game_id, user, action, move):
+        # nothing changed, no update to send
+        return False
+    game_class.log_move(game_id, user, action, move)
+    if settings.STORE_MOVE_ROWS:
+        id = game_class.get_id_from_nickname(game_id, user)
+        enqueue(game_type, game_id, MOVE, user_id=id,
+                action=action, move=move or '', time=time.time())
     if game_class.is_game_finished(game_id):
         game_class.try_finish_game(game_id)
     return True
@@ -227,26 +213,16 @@ def any_userscores_to_send(game_type, game_id):
 
 def send_scores_to_rabbitmq(game_type, game_id, scores):
     game_class = get_class(game_type)
-    jsondata = {
-        'game_type': game_type,
-        'players': {}
-    }
     try:
         if not was_scores_sent(game_type, game_id):
-            if game_class.is_game_drew(game_id):
-                for userid in game_class.get_players_ids(game_id):
-                    nickname = game_class.get_nickname_from_id(game_id, userid)
-                    jsondata['players'][userid] = game_class.get_user_score(
-                            game_id, nickname, 'draw')
-            else:
-                for endtype in scores['scores'].items():
-                    for nickname in endtype[1]:
-                        userid = game_class.get_id_from_nickname(game_id, nickname)
-                        jsondata['players'][userid] = game_class.get_user_score(
-                            game_id, nickname, endtype[0])
+            players, rating_params = game_class.get_users_scores(game_id)
+            jsondata = {
+                'game_type': game_type,
+                'players': players,
+            }
             if game_class.is_ranking_game(game_id):
                 send_game_data(jsondata)
-                game_class.update_rankings(game_id, jsondata)
+                game_class.update_rankings(game_id, jsondata, rating_params)
             game_class.set_scores_send(game_id, True)
     except Exception as err:
         print(f"Unexpected {err=}, {type(err)=}")
@@ -1,6 +1,72 @@
 from .game import Game
+from ..redis_utils import redis
+from ..engine.makao import MakaoState, THROW, DEMAND, starting_pile
+from ..engine.store import load_state, save_state, legal_moves
+from .cards_utils import cards_prefix, packing_symbols, card_from_code, to_codes, \
+    to_strings
 
 
 class Makao(Game):
-    def __init__(self):
-        pass
+    state_class = MakaoState
+
+    @classmethod
+    def start_game(cls, game_id):
+        super().start_game(game_id)
+        state = load_state(cls, game_id)
+        top = starting_pile(state.stack_draw)
+        if top is not None:
+            state.stack_throw.append(top)
+        save_state(cls, game_id, state)
+
+    @classmethod
+    def initial_state(cls, record):
+        state = super().initial_state(record)
+        if 'v' in record:
+            stack_draw = to_codes(state['stack_draw'])
+            top = starting_pile(stack_draw)
+            state['stack_throw'] = [card_from_code(top)] if top is not None else []
+            state['stack_draw'] = to_strings(stack_draw)
+        return state
+
+    @classmethod
+    def possible_moves(cls, game_id, user):
+        moves = legal_moves(cls, game_id, user)
+        # a demand is sent as a card: after J its rank, after A its suit
+        return {
+            'possible_actions': list(dict.fromkeys(action for action, _ in moves)),
+            'possible_moves': [card_from_code(move) for action, move in moves
+                               if action == THROW],
+            'possible_demands': [card_from_code(move) for action, move in moves
+                                 if action == DEMAND],
+        }
+
+    @classmethod
+    def game_state(cls, game_id):
+        game = cls.path_to_game(game_id)
+        info = super().game_state(game_id)
+        demand_rank = redis.jsonget('games', f'.{game}.demand_rank')
+        demand_suit = redis.jsonget('games', f'.{game}.demand_suit')
+        info['penalty'] = redis.jsonget('games', f'.{game}.penalty')
+        info['demand_rank'] = cards_prefix[demand_rank] \
+            if demand_rank is not None else None
+        info['demand_suit'] = packing_symbols[demand_suit] \
+            if demand_suit is not None else None
+        return info
+
+    @classmethod
+    def check_if_draw(cls, game_id):
+        game = cls.path_to_game(game_id)
+        return redis.jsonget('games', f'.{game}.is_draw')
+
+    @classmethod
+    def choose_losers(cls, game_id):
+        game = cls.path_to_game(game_id)
+        redis.jsonset('games', f'.{game}.scores.lose', [
+            values['nickname']
+            for values in redis.jsonget('games', f'.{game}.players').values()
+            if values['hand']])
+
+    @classmethod
+    def get_losing_nicknames(cls, game_id):
+        game = cls.path_to_game(game_id)
+        return redis.jsonget('games', f'.{game}.scores.lose')
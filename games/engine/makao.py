@@ -0,0 +1,253 @@
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+from .state import GameState, ONGOING
+from ..classes.cards_utils import DECK_SIZE, FULL_DECK_MASK, RANKS, \
+    cards_prefix, packing_symbols, card_code, card_suit
+
+TAKE = 'take'
+THROW = 'throw'
+END = 'end'
+DEMAND = 'demand'
+
+TWO, THREE, FOUR, JACK, QUEEN, KING, ACE = (
+    cards_prefix.index(prefix) for prefix in ('2', '3', '4', 'J', 'Q', 'K', 'A'))
+# ranks a jack can demand: 5 - 10
+DEMANDABLE_RANKS = range(cards_prefix.index('5'), cards_prefix.index('0') + 1)
+KING_HEARTS = card_code('KH')
+KING_SPADES = card_code('KS')
+
+# cards the next player has to take
+PENALTIES = bytes(
+    2 if RANKS[code] == TWO else
+    3 if RANKS[code] == THREE else
+    5 if code in (KING_HEARTS, KING_SPADES) else 0
+    for code in range(DECK_SIZE))
+RANK_MASKS = [sum(1 << code for code in range(DECK_SIZE) if RANKS[code] == rank)
+              for rank in range(len(cards_prefix))]
+SUIT_MASKS = [sum(1 << code for code in range(DECK_SIZE) if card_suit(code) == suit)
+              for suit in range(len(packing_symbols))]
+BATTLE_MASK = sum(1 << code for code in range(DECK_SIZE) if PENALTIES[code])
+# cards with an effect, a game does not start on them
+FUNCTION_MASK = BATTLE_MASK | RANK_MASKS[FOUR] | RANK_MASKS[JACK] \
+    | RANK_MASKS[QUEEN] | RANK_MASKS[ACE]
+
+# Per top card: masks of the cards that can be thrown on it
+RuleTables = namedtuple('RuleTables', ['match', 'battle'])
+
+
+@lru_cache(maxsize=None)
+def rule_tables(queen_on_all, all_on_queen):
+    """
+    Built once per parameter set
+    match[top]: same rank or suit, queens by the queen parameters
+    battle[top]: battle cards (2, 3, K hearts, K spades) of the same
+    rank or suit, when a penalty is pending
+    """
+    match = []
+    battle = []
+    for top in range(DECK_SIZE):
+        same = RANK_MASKS[RANKS[top]] | SUIT_MASKS[card_suit(top)]
+        allowed = same
+        if queen_on_all:
+            allowed |= RANK_MASKS[QUEEN]
+        if all_on_queen and RANKS[top] == QUEEN:
+            allowed = FULL_DECK_MASK
+        match.append(allowed)
+        battle.append(same & BATTLE_MASK)
+    return RuleTables(match, battle)
+
+
+def starting_pile(deck):
+    """
+    Pops the first card without an effect from the deck as the top of the
+    throw stack, function cards popped before it go to the deck bottom.
+    The last card is used when all are function cards, None for an empty deck
+    """
+    if not deck:
+        return None
+    skipped = array('B')
+    while len(deck) > 1 and (1 << deck[-1]) & FUNCTION_MASK:
+        skipped.append(deck.pop())
+    top = deck.pop()
+    deck[0:0] = skipped
+    return top
+
+
+def hand_mask(hand):
+    mask = 0
+    for code in hand:
+        mask |= 1 << code
+    return mask
+
+
+class MakaoState(GameState):
+    """
+    A card is thrown on the same rank or suit, more cards of the rank the
+    player started with may follow in the same turn. Without a card to
+    throw the player takes one and may throw it if it fits.
+    2, 3, K hearts and K spades make the next player take 2, 3 or 5
+    cards unless they throw a battle card of the same rank or suit,
+    penalties add up, K spades sends it back to the previous player.
+    4 makes the next player wait a turn unless they throw a 4.
+    J demands a rank (5 - 10) from every player for one round,
+    A demands a suit until the next card is thrown.
+    The first player without cards wins.
+    """
+    __slots__ = ('queen_on_all', 'all_on_queen', 'penalty', 'penalty_back',
+                 'skips', 'waits', 'demand_rank', 'demand_left', 'demand_suit',
+                 'turn_rank', 'drawn')
+    ROOM_FIELDS = GameState.ROOM_FIELDS + (
+        'penalty', 'penalty_back', 'skips', 'waits', 'demand_rank',
+        'demand_left', 'demand_suit', 'turn_rank', 'drawn')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queen_on_all = True
+        self.all_on_queen = False
+        self.penalty = 0
+        # K spades: the penalty goes to the previous player
+        self.penalty_back = False
+        self.skips = 0
+        # chair -> turns still to wait
+        self.waits = {}
+        self.demand_rank = None
+        # turns the demanded rank still holds
+        self.demand_left = 0
+        self.demand_suit = None
+        # rank thrown in the current turn, more of it may follow
+        self.turn_rank = None
+        # the current player took a card and may only throw that one
+        self.drawn = False
+
+    @classmethod
+    def from_room(cls, room):
+        state = super().from_room(room)
+        params = room['game_parameters']
+        state.queen_on_all = params.get('queen_on_all', True)
+        state.all_on_queen = params.get('all_on_queen', False)
+        return state
+
+    def tables(self):
+        return rule_tables(self.queen_on_all, self.all_on_queen)
+
+    def is_finished(self):
+        return super().is_finished() or self.status == ONGOING and any(
+            not player.hand for player in self.players.values())
+
+    def playable_mask(self):
+        if not self.stack_throw:
+            return FULL_DECK_MASK
+        top = self.stack_throw[-1]
+        if self.penalty:
+            return self.tables().battle[top]
+        if self.skips:
+            return RANK_MASKS[FOUR]
+        if self.demand_rank is not None:
+            return RANK_MASKS[self.demand_rank] | RANK_MASKS[JACK]
+        if self.demand_suit is not None:
+            return SUIT_MASKS[self.demand_suit] | RANK_MASKS[ACE]
+        return self.tables().match[top]
+
+    def legal_moves(self, chair):
+        if chair is None or chair != self.current_player or self.is_finished():
+            return []
+        hand = self.players[chair].hand
+        if self.drawn:
+            moves = []
+            if (1 << hand[-1]) & self.playable_mask():
+                moves.append((THROW, hand[-1]))
+            return moves + [(END, None)]
+        if self.turn_rank is not None:
+            return self.continuations(hand)
+        playable = hand_mask(hand) & self.playable_mask()
+        moves = [(THROW, card) for card in hand if (1 << card) & playable]
+        return moves + [(END, None) if self.skips else (TAKE, None)]
+
+    def continuations(self, hand):
+        rank_mask = RANK_MASKS[self.turn_rank]
+        moves = [(THROW, card) for card in hand if (1 << card) & rank_mask]
+        if self.turn_rank == JACK:
+            moves += [(DEMAND, rank * len(packing_symbols)) for rank in DEMANDABLE_RANKS]
+        elif self.turn_rank == ACE:
+            moves += [(DEMAND, ACE * len(packing_symbols) + suit)
+                      for suit in range(len(packing_symbols))]
+        return moves + [(END, None)]
+
+    def apply(self, chair, action, move=None, trusted=False):
+        if not trusted and (action, move if action in (THROW, DEMAND) else None) \
+                not in self.legal_moves(chair):
+            return False
+        player = self.players[chair]
+        if action == THROW:
+            self.throw(player, move)
+        elif action == TAKE:
+            if self.penalty:
+                self.draw(player, self.penalty)
+                self.penalty = 0
+                self.penalty_back = False
+                self.end_turn()
+            else:
+                self.drawn = self.draw(player, 1) == 1
+                if not self.drawn or self.legal_moves(chair) == [(END, None)]:
+                    self.end_turn()
+        elif action == DEMAND:
+            if self.turn_rank == JACK:
+                self.demand_rank = RANKS[move]
+                # the turn ending now does not count, the demanding player answers last
+                self.demand_left = len(self.players) + 1
+            else:
+                self.demand_suit = card_suit(move)
+            self.end_turn()
+        else:
+            if self.skips:
+                self.waits[chair] = self.skips - 1
+                self.skips = 0
+            self.end_turn()
+        return True
+
+    def throw(self, player, card):
+        player.hand.remove(card)
+        self.stack_throw.append(card)
+        if self.turn_rank is None:
+            self.demand_suit = None
+        self.drawn = False
+        self.turn_rank = RANKS[card]
+        if PENALTIES[card]:
+            self.penalty += PENALTIES[card]
+            self.penalty_back = card == KING_SPADES
+        elif self.turn_rank == FOUR:
+            self.skips += 1
+        if not self.is_finished() and self.continuations(player.hand) == [(END, None)]:
+            self.end_turn()
+
+    def draw(self, player, count):
+        """
+        return the number of cards taken, fewer when no cards are left
+        """
+        for taken in range(count):
+            if not self.stack_draw:
+                # thrown cards under the top one become the draw stack
+                self.stack_draw = self.stack_throw[-2::-1]
+                del self.stack_throw[:-1]
+            if not self.stack_draw:
+                return taken
+            player.hand.append(self.stack_draw.pop())
+        return count
+
+    def end_turn(self):
+        self.turn_rank = None
+        self.drawn = False
+        if self.demand_rank is not None:
+            self.demand_left -= 1
+            if self.demand_left == 0:
+                self.demand_rank = None
+        if self.penalty and self.penalty_back:
+            chairs = list(self.players)
+            chair = chairs[chairs.index(self.current_player) - 1]
+        else:
+            chair = self.next_chair()
+        while self.waits.get(chair):
+            self.waits[chair] -= 1
+            chair = self.next_chair(chair)
+        self.current_player = chair
@@ -0,0 +1,24 @@
+from itertools import islice
+from ..classes.cards_utils import CARD_CODES
+
+
+def replay(state, moves):
+    """
+    Re-executes a move log against the rules, moves = [(chair, action, move)]
+    with cards as strings as in the log. Yields (chair, action, move, applied)
+    after each move, state holding the position right after it.
+    A move that is not applied means the log and the rules disagree.
+    """
+    for chair, action, move in moves:
+        applied = (move is None or move in CARD_CODES) and state.apply(
+            chair, action, CARD_CODES[move] if move else None)
+        yield chair, action, move, applied
+
+
+def state_at(state, moves, number):
+    """
+    Position after move `number` (0-based), -1 for the start
+    """
+    for _ in islice(replay(state, moves), number + 1):
+        pass
+    return state
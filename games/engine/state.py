@@ -0,0 +1,137 @@
+import random
+from abc import ABC, abstractmethod
+from array import array
+from ..classes.cards_utils import shuffled_deck, to_codes, to_strings
+
+WAITING = 'waiting'
+ONGOING = 'ongoing'
+FINISHED = 'finished'
+
+
+def deal(chairs, cards_on_hand, seed):
+    """
+    Everything random in a game comes from its seed: the shuffled deck,
+    hands popped from it in chairs order, then the starting player
+    return ({chair: hand}, stack_draw, starting_player)
+    """
+    rng = random.Random(seed)
+    deck = shuffled_deck(rng)
+    hands = {chair: array('B', [deck.pop() for _ in range(cards_on_hand)])
+             for chair in chairs}
+    starting_player = chairs[rng.randrange(len(chairs))]
+    return hands, deck, starting_player
+
+
+class PlayerState:
+    __slots__ = ('id', 'nickname', 'hand', 'points', 'last_action')
+
+    def __init__(self, id=None, nickname=None, hand=None, points=0,
+                 last_action=None):
+        self.id = id
+        self.nickname = nickname
+        # array('B') of card codes
+        self.hand = hand if hand is not None else array('B')
+        self.points = points
+        self.last_action = last_action
+
+    @classmethod
+    def from_room(cls, values):
+        return cls(values.get('id'), values.get('nickname'),
+                   to_codes(values.get('hand', [])), values.get('points', 0),
+                   values.get('last_action'))
+
+    def to_room(self):
+        return {
+            'hand': to_strings(self.hand),
+            'points': self.points,
+            'last_action': self.last_action,
+        }
+
+
+class GameState(ABC):
+    """
+    Rules of a game run on this object only, without Redis.
+    Players are kept in chair order ('p1', 'p2', ...) as in the room.
+    ROOM_FIELDS are the room keys the rules read and write, status is
+    only read: finishing a game stays with the game classes.
+    Cards are codes (cards_utils) in the state and strings in the room,
+    CARD_FIELDS are converted when loading and saving.
+    """
+    __slots__ = ('players', 'max_players', 'status', 'current_player',
+                 'stack_draw', 'stack_throw', 'source')
+    ROOM_FIELDS = ('current_player', 'stack_draw', 'stack_throw')
+    CARD_FIELDS = ('stack_draw', 'stack_throw')
+
+    def __init__(self, players, max_players, status=ONGOING,
+                 current_player=None, stack_draw=None, stack_throw=None):
+        # chair -> PlayerState
+        self.players = players
+        self.max_players = max_players
+        self.status = status
+        self.current_player = current_player
+        self.stack_draw = stack_draw if stack_draw is not None else array('B')
+        self.stack_throw = stack_throw if stack_throw is not None else array('B')
+        # the room read by from_room, saving writes only what changed
+        self.source = None
+
+    @classmethod
+    def from_room(cls, room):
+        """
+        room = the game's JSON in Redis, or Game.initial_state(record)
+        """
+        state = cls(
+            {chair: PlayerState.from_room(values)
+             for chair, values in room['players'].items()},
+            room['game_parameters']['max_players'],
+            room.get('status', ONGOING))
+        for field in cls.ROOM_FIELDS:
+            if field in cls.CARD_FIELDS:
+                setattr(state, field, to_codes(room.get(field, [])))
+            elif field in room:
+                setattr(state, field, room[field])
+        state.source = room
+        return state
+
+    def to_room(self):
+        """
+        {field: value} of ROOM_FIELDS plus 'players': {chair: {field: value}}
+        """
+        room = {field: to_strings(getattr(self, field))
+                if field in self.CARD_FIELDS else getattr(self, field)
+                for field in self.ROOM_FIELDS}
+        room['players'] = {chair: player.to_room()
+                           for chair, player in self.players.items()}
+        return room
+
+    def chair(self, nickname):
+        for chair, player in self.players.items():
+            if player.nickname == nickname:
+                return chair
+        return None
+
+    def next_chair(self, chair=None):
+        chairs = list(self.players)
+        position = chairs.index(self.current_player if chair is None else chair)
+        return chairs[(position + 1) % len(chairs)]
+
+    def is_finished(self):
+        """
+        Subclasses add their end by cards, checked only while the game is
+        ongoing: players of a waiting lobby hold no hands yet
+        """
+        return self.status == FINISHED
+
+    @abstractmethod
+    def legal_moves(self, chair):
+        """
+        [(action, move), ...] of chair, [] for a chair not in the game
+        """
+        pass
+
+    @abstractmethod
+    def apply(self, chair, action, move=None, trusted=False):
+        """
+        Plays a move, return False if it is not legal.
+        trusted: the move was already found in legal_moves of this position
+        """
+        pass
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from redis.exceptions import ResponseError
+from ..redis_utils import redis
+from .state import ONGOING
+
+# Persistence adapter between a room in Redis and its engine state:
+# one read of the whole room, one pipelined write of the fields the
+# rules own. Everything else in the room (nicknames, timers, scores)
+# is left to the game classes.
+# Lists only popped or appended to since the read (taking a card from
+# stack_draw into a hand) are trimmed or appended to in place, other
+# changed fields are written whole.
+# A room is created with version 0 and every change of the state the
+# rules read (start, save, finish, back to the lobby) bumps it, legal
+# moves are cached per (room, seed, version, user): validating a move
+# and sending the possible moves of the same position compute them
+# once. The seed keeps a restarted room apart from its earlier game.
+# Reads never write: a room started before versions were kept reads as
+# version 0 and gets the key on its first bump.
+MOVES_CACHE_SIZE = 4096
+moves_cache = OrderedDict()
+
+
+def load_state(game_class, game_id):
+    room = redis.jsonget('games', f'.{game_class.path_to_game(game_id)}')
+    return game_class.state_class.from_room(room)
+
+
+def save_state(game_class, game_id, state):
+    game = game_class.path_to_game(game_id)
+    room = state.to_room()
+    source = state.source or {}
+    source_players = source.get('players', {})
+    pipe = redis.pipeline()
+    bump_version(pipe, game)
+    for chair, values in room.pop('players').items():
+        for field, value in values.items():
+            write_field(pipe, f'.{game}.players.{chair}.{field}',
+                        source_players.get(chair, {}).get(field), value)
+    for field, value in room.items():
+        write_field(pipe, f'.{game}.{field}', source.get(field), value)
+    pipe.execute()
+
+
+def write_field(pipe, path, old, new):
+    if new == old:
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        if len(new) > len(old) and new[:len(old)] == old:
+            pipe.jsonarrappend('games', path, *new[len(old):])
+            return
+        if 0 < len(new) < len(old) and old[:len(new)] == new:
+            pipe.jsonarrtrim('games', path, 0, len(new) - 1)
+            return
+    pipe.jsonset('games', path, new)
+
+
+def bump_version(pipe, game):
+    # rooms created before versions were kept have no key yet
+    pipe.jsonset('games', f'.{game}.version', 0, nx=True)
+    pipe.jsonnumincrby('games', f'.{game}.version', 1)
+
+
+def room_version(game_class, game_id):
+    """
+    (seed, version) of the room
+    """
+    game = game_class.path_to_game(game_id)
+    try:
+        values = redis.jsonget('games', f'.{game}.seed', f'.{game}.version')
+        return values[f'.{game}.seed'], values[f'.{game}.version']
+    except ResponseError:
+        # started before seeds and versions were kept in the room
+        return None, 0
+
+
+def state_version(state):
+    """
+    (seed, version) of the room a state was loaded from
+    """
+    return state.source.get('seed'), state.source.get('version', 0)
+
+
+def cached_moves(game_class, game_id, user):
+    """
+    ((seed, version), [(action, move), ...] of user), no moves when it
+    is not their turn
+    """
+    game = game_class.path_to_game(game_id)
+    version = room_version(game_class, game_id)
+    moves = moves_cache.get((game, *version, user))
+    if moves is not None:
+        moves_cache.move_to_end((game, *version, user))
+        return version, moves
+    room = redis.jsonget('games', f'.{game}')
+    state = game_class.state_class.from_room(room)
+    chair = state.chair(user)
+    if chair is None or chair != state.current_player or state.status != ONGOING \
+            or state.is_finished():
+        moves = []
+    else:
+        moves = state.legal_moves(chair)
+    # keyed by the version read with the state, it may be newer than the first read
+    version = state_version(state)
+    moves_cache[(game, *version, user)] = moves
+    if len(moves_cache) > MOVES_CACHE_SIZE:
+        moves_cache.popitem(last=False)
+    return version, moves
+
+
+def legal_moves(game_class, game_id, user):
+    return cached_moves(game_class, game_id, user)[1]
@@ -0,0 +1,76 @@
+from array import array
+from .state import GameState, ONGOING
+from ..classes.cards_utils import compare_ranks
+
+TAKE = 'take'
+THROW = 'throw'
+
+
+class WarState(GameState):
+    """
+    A player throws a card and takes one from the draw stack until it is
+    empty. When every player threw, the higher card takes the throw stack
+    as points and plays next; equal cards start a war: the next round
+    is thrown blind and the round after it decides.
+    """
+    __slots__ = ('war_event', 'war_event_next_move', 'next_player')
+    ROOM_FIELDS = GameState.ROOM_FIELDS + (
+        'war_event', 'war_event_next_move', 'next_player')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.war_event = False
+        self.war_event_next_move = False
+        # winner of the last round, plays after taking a card
+        self.next_player = None
+
+    def is_finished(self):
+        return super().is_finished() or self.status == ONGOING and all(
+            not player.hand for player in self.players.values())
+
+    def legal_moves(self, chair):
+        player = self.players.get(chair)
+        if player is None or chair != self.current_player:
+            return []
+        if player.last_action == TAKE or not self.stack_draw:
+            return [(THROW, card) for card in player.hand]
+        return [(TAKE, None)]
+
+    def pass_turn(self):
+        if self.next_player is not None:
+            self.current_player = self.next_player
+            self.next_player = None
+        else:
+            self.current_player = self.next_chair()
+
+    def apply(self, chair, action, move=None, trusted=False):
+        if not trusted and (self.is_finished() or (action, move if action == THROW else None)
+                            not in self.legal_moves(chair)):
+            return False
+        player = self.players[chair]
+        if action == TAKE:
+            # the deck was shuffled at start
+            player.hand.append(self.stack_draw.pop())
+            self.pass_turn()
+        else:
+            self.war_event = self.war_event_next_move
+            player.hand.remove(move)
+            self.stack_throw.append(move)
+            if len(self.stack_throw) % self.max_players == 0:
+                if self.war_event:
+                    self.war_event_next_move = False
+                else:
+                    result = compare_ranks(self.stack_throw[-1], self.stack_throw[-2])
+                    if result == 0:
+                        self.war_event_next_move = True
+                    else:
+                        winner = self.current_player if result == 1 \
+                            else self.next_chair()
+                        self.players[winner].points += len(self.stack_throw)
+                        self.stack_throw = array('B')
+                        self.next_player = winner
+
+        if not self.stack_draw:
+            self.pass_turn()
+        player.last_action = action
+        return True
@@ -0,0 +1,110 @@
+import numpy as np
+from ..classes.cards_utils import DECK_SIZE, RANKS
+
+# Plays many War games at once, one row per game: decks are an int matrix
+# and every round (both players throw one card, then each takes one from
+# the deck while it lasts) is resolved for all games with array operations.
+# Follows engine.war.WarState: higher rank takes the pot, equal ranks start
+# a war where the next round is thrown blind and the one after decides.
+# A pot still open after the last round is not scored.
+# Only the 2 player game is modelled, as War is configured (war.json).
+PLAYERS = 2
+POLICIES = ('random', 'highest', 'lowest', 'first')
+CHUNK_SIZE = 100_000
+RANK_TABLE = np.frombuffer(RANKS, dtype=np.uint8).astype(np.int8)
+EMPTY = -1
+
+
+def moves_per_game(cards_on_hand):
+    # every card is thrown once and every card left in the deck is taken once
+    return DECK_SIZE + DECK_SIZE - 2 * cards_on_hand
+
+
+def choose_slots(hands, policy, rng):
+    """
+    Index of the card thrown from every hand row, among non empty slots
+    """
+    present = hands != EMPTY
+    if policy == 'random':
+        keys = np.where(present, rng.random(hands.shape), -1)
+        return keys.argmax(axis=1)
+    if policy == 'first':
+        return present.argmax(axis=1)
+    ranks = RANK_TABLE[hands]
+    if policy == 'highest':
+        return np.where(present, ranks, -1).argmax(axis=1)
+    return np.where(present, ranks, 99).argmin(axis=1)
+
+
+def simulate_chunk(games, cards_on_hand, policy, rng):
+    decks = rng.permuted(
+        np.tile(np.arange(DECK_SIZE, dtype=np.int8), (games, 1)), axis=1)
+    hands = [decks[:, :cards_on_hand].copy(),
+             decks[:, cards_on_hand:2 * cards_on_hand].copy()]
+    rows = np.arange(games)
+    points = np.zeros((2, games), dtype=np.int16)
+    pot = np.zeros(games, dtype=np.int16)
+    war_events = np.zeros(games, dtype=np.int16)
+    blind = np.zeros(games, dtype=bool)
+    draws_left = (DECK_SIZE - 2 * cards_on_hand) // 2
+
+    for round_number in range(DECK_SIZE // PLAYERS):
+        slots = [choose_slots(hand, policy, rng) for hand in hands]
+        ranks = [RANK_TABLE[hand[rows, slot]] for hand, slot in zip(hands, slots)]
+        pot += 2
+        result = np.sign(ranks[0] - ranks[1])
+        decided = ~blind & (result != 0)
+        points[0] += np.where(decided & (result > 0), pot, 0).astype(np.int16)
+        points[1] += np.where(decided & (result < 0), pot, 0).astype(np.int16)
+        pot[decided] = 0
+        tie = ~blind & (result == 0)
+        war_events += tie
+        blind = tie
+
+        for player, (hand, slot) in enumerate(zip(hands, slots)):
+            if round_number < draws_left:
+                hand[rows, slot] = decks[:, PLAYERS * cards_on_hand
+                                         + PLAYERS * round_number + player]
+            else:
+                hand[rows, slot] = EMPTY
+
+    return points, pot, war_events
+
+
+def simulate(games, cards_on_hand, policy='random', seed=None, players=PLAYERS):
+    """
+    return {'points': (2, games), 'unscored': (games,), 'war_events': (games,)}
+    """
+    if players != PLAYERS:
+        raise ValueError(f'Only {PLAYERS} player games can be simulated')
+    if policy not in POLICIES:
+        raise ValueError(f'Unknown policy {policy}')
+    rng = np.random.default_rng(seed)
+    results = []
+    for start in range(0, games, CHUNK_SIZE):
+        results.append(simulate_chunk(
+            min(CHUNK_SIZE, games - start), cards_on_hand, policy, rng))
+    return {
+        'points': np.concatenate([points for points, _, _ in results], axis=1),
+        'unscored': np.concatenate([pot for _, pot, _ in results]),
+        'war_events': np.concatenate([wars for _, _, wars in results]),
+    }
+
+
+def summarize(results, cards_on_hand):
+    points = results['points'].astype(int)
+    margin = np.abs(points[0] - points[1])
+    war_events = results['war_events']
+    return {
+        'cards_on_hand': cards_on_hand,
+        'games': points.shape[1],
+        'moves': moves_per_game(cards_on_hand),
+        'draw_rate': float(np.mean(points[0] == points[1])),
+        'war_events_mean': float(war_events.mean()),
+        'war_events_p95': float(np.percentile(war_events, 95)),
+        'war_events_max': int(war_events.max()),
+        'no_war_rate': float(np.mean(war_events == 0)),
+        'margin_mean': float(margin.mean()),
+        'margin_p95': float(np.percentile(margin, 95)),
+        'unscored_rate': float(np.mean(results['unscored'] > 0)),
+    }
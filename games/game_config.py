@@ -0,0 +1,79 @@
+import json
+import hashlib
+
+# Lobby parameters of a game type (registry.config_path) compiled
+# once: 'm:ss' bounds converted to seconds, one validator per parameter
+# and the JSON served to clients serialized with its ETag.
+PARAM_TYPES = ('int', 'bool', 'time')
+# booleans may come from query strings and form fields as text
+BOOL_VALUES = {'true': True, 'false': False, '1': True, '0': False}
+
+
+def time_to_seconds(time):
+    """
+    '2:00' -> 120
+    """
+    seconds = 0
+    for part in time.split(':'):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+class ParamValidator:
+    __slots__ = ('name', 'type', 'default', 'min', 'max')
+
+    def __init__(self, name, setup):
+        self.name = name
+        self.type = setup['type']
+        if self.type not in PARAM_TYPES:
+            raise Exception('Parameter type has no implemented checking')
+        convert = time_to_seconds if self.type == 'time' else (lambda value: value)
+        self.default = convert(setup['default']) if 'default' in setup else None
+        self.min = convert(setup['min']) if 'min' in setup else None
+        self.max = convert(setup['max']) if 'max' in setup else None
+
+    def __call__(self, value):
+        """
+        return the coerced value, raises when it is out of bounds
+        """
+        if self.type == 'bool':
+            if isinstance(value, (bool, int)) and value in (0, 1):
+                return bool(value)
+            if isinstance(value, str) and value.lower() in BOOL_VALUES:
+                return BOOL_VALUES[value.lower()]
+            raise Exception('bool parameter is incorrect')
+        value = int(value)
+        if self.min <= value <= self.max:
+            return value
+        raise Exception(f'{self.type} parameter is incorrect')
+
+
+class GameConfig:
+    __slots__ = ('source', 'params', 'defaults', 'body', 'etag')
+
+    def __init__(self, source):
+        # the parsed JSON, as served to clients
+        self.source = source
+        self.params = [ParamValidator(name, setup) for name, setup in source.items()
+                       if name != 'game_params']
+        self.params += [ParamValidator(param['param_name'], param['param_setup'])
+                        for param in source.get('game_params', [])]
+        self.defaults = {param.name: param.default for param in self.params}
+        self.body = json.dumps(source).encode()
+        self.etag = f'"{hashlib.md5(self.body).hexdigest()}"'
+
+    def validate(self, game_parameters):
+        """
+        return game_parameters with every configured value coerced and
+        the missing ones filled from defaults, raises on an incorrect one
+        or a missing one without a default
+        """
+        coerced = {}
+        for param in self.params:
+            if param.name in game_parameters:
+                coerced[param.name] = param(game_parameters[param.name])
+            elif param.default is not None:
+                coerced[param.name] = param.default
+            else:
+                raise Exception(f'{param.name} parameter is missing')
+        return {**game_parameters, **coerced}
@@ -0,0 +1,85 @@
+import json
+from .redis_utils import redis
+
+# One sorted set per game type: member = user id, score = rating.
+# Nicknames shown next to ratings are kept in a single hash.
+# The rating engine state of a player besides the rating (JSON) is kept
+# in a hash per game type.
+LEADERBOARD_PREFIX = 'leaderboard'
+NICKNAMES = f'{LEADERBOARD_PREFIX}:nicknames'
+
+
+def leaderboard_name(game_type):
+    return f'{LEADERBOARD_PREFIX}:{game_type}'
+
+
+def rating_params_name(game_type):
+    return f'{LEADERBOARD_PREFIX}:{game_type}:params'
+
+
+def set_rating(game_type, user_id, rating, nickname=None):
+    redis.zadd(leaderboard_name(game_type), {user_id: rating})
+    if nickname is not None:
+        redis.hset(NICKNAMES, user_id, nickname)
+
+
+def set_rating_params(game_type, params):
+    """
+    params = {user_id: {deviation, volatility}}
+    """
+    if params:
+        redis.hset(rating_params_name(game_type), mapping={
+            user_id: json.dumps(values) for user_id, values in params.items()})
+
+
+def rating_params(game_type, user_ids):
+    """
+    [{deviation, volatility} | None] in user_ids order
+    """
+    if not user_ids:
+        return []
+    return [json.loads(values) if values is not None else None
+            for values in redis.hmget(rating_params_name(game_type), user_ids)]
+
+
+def entries(game_type, start, stop):
+    """
+    [{position, user, nickname, rating}] for 0-based positions start..stop
+    """
+    ratings = redis.zrevrange(leaderboard_name(game_type), start, stop,
+                              withscores=True)
+    if not ratings:
+        return []
+    nicknames = redis.hmget(NICKNAMES, [user for user, _ in ratings])
+    return [{
+        'position': start + i + 1,
+        'user': int(user),
+        'nickname': nickname,
+        'rating': rating,
+    } for i, ((user, rating), nickname) in enumerate(zip(ratings, nicknames))]
+
+
+def top(game_type, count):
+    return entries(game_type, 0, count - 1)
+
+
+def player_rank(game_type, user_id):
+    name = leaderboard_name(game_type)
+    position = redis.zrevrank(name, user_id)
+    if position is None:
+        return None
+    return {
+        'position': position + 1,
+        'user': user_id,
+        'nickname': redis.hget(NICKNAMES, user_id),
+        'rating': redis.zscore(name, user_id),
+        'players': redis.zcard(name),
+    }
+
+
+def around_rating(game_type, rating, count):
+    """
+    count players above and count players at or below the given rating
+    """
+    position = redis.zcount(leaderboard_name(game_type), f'({rating}', '+inf')
+    return entries(game_type, max(position - count, 0), position + count - 1)
@@ -0,0 +1,98 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from ...models import GameType, Game, Participation, Move
+
+BENCH_TYPE = 'benchmark'
+PLAYERS_PER_GAME = 2
+
+
+class Command(BaseCommand):
+    help = 'Seeds the history tables step by step and times the hot lookups ' \
+           'after each step. Runs in one transaction which is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=2_000_000)
+        parser.add_argument('--steps', type=int, default=4)
+        parser.add_argument('--moves-per-player', type=int, default=2)
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--lookups', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            gametype = GameType.objects.create(type_name=BENCH_TYPE)
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT now()')
+                self.now = cursor.fetchone()[0]
+
+            self.stdout.write(f'{"games":>10}{"moves":>12}{"room id ms":>12}'
+                              f'{"user/type ms":>14}{"moves/min ms":>14}')
+            seeded = 0
+            step = options['games'] // options['steps']
+            for _ in range(options['steps']):
+                self.seed(gametype, seeded, seeded + step, options)
+                seeded += step
+                room_id, user_type, move_range = self.measure(
+                    gametype, seeded, options)
+                moves = seeded * PLAYERS_PER_GAME * options['moves_per_player']
+                self.stdout.write(f'{seeded:>10}{moves:>12}{room_id:>12.3f}'
+                                  f'{user_type:>14.3f}{move_range:>14.3f}')
+            transaction.set_rollback(True)
+
+    def seed(self, gametype, start, stop, options):
+        game_table = Game._meta.db_table
+        participation_table = Participation._meta.db_table
+        move_table = Move._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT coalesce(max(id), 0) FROM {game_table}')
+            last_game = cursor.fetchone()[0]
+            cursor.execute(
+                f'SELECT coalesce(max(id), 0) FROM {participation_table}')
+            last_participation = cursor.fetchone()[0]
+
+            # game g is g seconds older than now()
+            cursor.execute(f'''
+                INSERT INTO {game_table} (start_state, game_type_id, datetime)
+                SELECT jsonb_build_object('game_id', 'b' || g), %s,
+                       now() - g * interval '1 second'
+                FROM generate_series(%s, %s) g''',
+                           [gametype.pk, start, stop - 1])
+            cursor.execute(f'''
+                INSERT INTO {participation_table} ("user", game_id, score)
+                SELECT (random() * %s)::int, g.id, %s
+                FROM {game_table} g, generate_series(1, %s)
+                WHERE g.id > %s''',
+                           [options['users'], Participation.ScoreTypes.WIN,
+                            PLAYERS_PER_GAME, last_game])
+            cursor.execute(f'''
+                INSERT INTO {move_table}
+                    (participation_id, action, move, datetime)
+                SELECT p.id, 'throw', '0H', g.datetime
+                FROM {participation_table} p
+                JOIN {game_table} g ON g.id = p.game_id,
+                     generate_series(1, %s)
+                WHERE p.id > %s
+                ORDER BY g.datetime''',
+                           [options['moves_per_player'], last_participation])
+            cursor.execute('ANALYZE')
+
+    def measure(self, gametype, seeded, options):
+        def timed(query):
+            started = time.perf_counter()
+            for _ in range(options['lookups']):
+                query()
+            return (time.perf_counter() - started) / options['lookups'] * 1000
+
+        def moves_in_minute():
+            end = self.now - timedelta(seconds=random.randrange(seeded))
+            return Move.objects.filter(
+                datetime__range=(end - timedelta(minutes=1), end)).count()
+
+        room_id = timed(lambda: list(Game.objects.get_by_gameroom_id(
+            f'b{random.randrange(seeded)}')))
+        user_type = timed(lambda: Participation.objects.get_by_userid_gametype(
+            random.randrange(options['users']), gametype).last())
+        move_range = timed(moves_in_minute)
+        return room_id, user_type, move_range
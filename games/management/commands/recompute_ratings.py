@@ -0,0 +1,109 @@
+import time
+from itertools import groupby
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from ...models import GameType, Participation, PlayerStats
+from ...ranking import ENGINES, RatingReplay, WIN, DRAW, LOSE, get_engine
+from ...leaderboard import set_rating, set_rating_params
+
+RESULTS = {
+    Participation.ScoreTypes.WIN: WIN,
+    Participation.ScoreTypes.WIN_BY_DISCONNECT: WIN,
+    Participation.ScoreTypes.DRAW: DRAW,
+    Participation.ScoreTypes.LOSE: LOSE,
+    Participation.ScoreTypes.LOSE_BY_DISCONNECT: LOSE,
+}
+CHUNK_SIZE = 10000
+REPORT_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = 'Replays finished games of a game type in chronological order ' \
+           'and recomputes every player rating'
+
+    def add_arguments(self, parser):
+        parser.add_argument('game_type')
+        parser.add_argument('--engine', choices=ENGINES.keys(),
+                            default=settings.RATING_ENGINE)
+        parser.add_argument('--k', type=float, help='elo K-factor')
+        parser.add_argument('--initial-rating', type=float, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only report rating changes')
+
+    def handle(self, *args, **options):
+        gametype = GameType.objects.get_typegame_lower_nospecial(
+            options['game_type'])
+        if gametype is None:
+            raise CommandError('Game does not exist')
+
+        started = time.perf_counter()
+        params = {'initial_rating': options['initial_rating']}
+        if options['k'] is not None:
+            params['k'] = options['k']
+        try:
+            replay = RatingReplay(get_engine(options['engine'], **params))
+        except TypeError:
+            raise CommandError(f'Wrong parameters for {options["engine"]}')
+        games = self.replay(replay, gametype)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{games} games, {len(replay.index)} players '
+                          f'replayed in {elapsed:.1f}s')
+
+        states = replay.all_states()
+        self.report(gametype, states)
+        if not options['dry_run']:
+            self.save(gametype, options['game_type'], replay.engine, states)
+
+    def replay(self, replay, gametype):
+        participations = Participation.objects.filter(
+            game__game_type=gametype,
+            score__in=RESULTS.keys(),
+        ).order_by('game__datetime', 'game_id').values_list(
+            'game_id', 'user', 'score').iterator(chunk_size=CHUNK_SIZE)
+        games = 0
+        for _, rows in groupby(participations, key=lambda row: row[0]):
+            rows = list(rows)
+            if len(rows) < 2:
+                continue
+            replay.play([user for _, user, _ in rows],
+                        [RESULTS[score] for _, _, score in rows])
+            games += 1
+        return games
+
+    def report(self, gametype, states):
+        current = dict(PlayerStats.objects.filter(
+            game_type=gametype, rating__isnull=False).values_list('user', 'rating'))
+        changes = sorted(
+            ((round(rating) - current.get(user, round(rating)), user, round(rating))
+             for user, (rating, *_) in states.items()),
+            key=lambda change: abs(change[0]), reverse=True)
+        changed = [change for change in changes if change[0] != 0]
+        self.stdout.write(f'{len(changed)} ratings change')
+        if changed:
+            mean = sum(abs(change) for change, _, _ in changed) / len(changed)
+            self.stdout.write(f'mean absolute change {mean:.1f}')
+        for change, user, rating in changed[:REPORT_SIZE]:
+            self.stdout.write(f'user {user:>10}: {rating - change:>6} -> {rating:>6} '
+                              f'({change:+})')
+
+    def save(self, gametype, game_name, engine, states):
+        params = {user: engine.params(state) for user, state in states.items()}
+        with transaction.atomic():
+            stats = {row.user: row for row in PlayerStats.objects.filter(
+                game_type=gametype, user__in=states.keys())}
+            for user, state in states.items():
+                if user not in stats:
+                    stats[user] = PlayerStats.objects.create(
+                        user=user, game_type=gametype)
+                stats[user].rating = round(state[0])
+                stats[user].rating_deviation = params[user].get('deviation')
+                stats[user].rating_volatility = params[user].get('volatility')
+            PlayerStats.objects.bulk_update(
+                stats.values(),
+                ['rating', 'rating_deviation', 'rating_volatility'],
+                batch_size=CHUNK_SIZE)
+        for user, state in states.items():
+            set_rating(game_name, user, round(state[0]))
+        set_rating_params(game_name, params)
+        self.stdout.write(f'{len(states)} ratings saved')
@@ -0,0 +1,35 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from ...models import Game
+from ...replay import replay_events
+
+
+class Command(BaseCommand):
+    help = 'Re-executes the move log of a stored game and prints the ' \
+           'position after a given move'
+
+    def add_arguments(self, parser):
+        parser.add_argument('game_pk', type=int)
+        parser.add_argument('--move', type=int, default=None,
+                            help='0-based move number, the last one by default')
+
+    def handle(self, *args, **options):
+        try:
+            game = Game.objects.select_related('game_type').get(pk=options['game_pk'])
+        except Game.DoesNotExist:
+            raise CommandError('Game does not exist')
+
+        position = None
+        for event in replay_events(game):
+            data = event['data']
+            if event['type'] == 'start':
+                position = data
+                continue
+            if data['applied'] is False:
+                self.stderr.write(f"move {data['number']} {data['chair']} "
+                                  f"{data['action']} {data['move']} was not applied")
+            if data['state'] is not None:
+                position = data['state']
+            if data['number'] == options['move']:
+                break
+        self.stdout.write(json.dumps(position, indent=2))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from ...engine.war_simulator import POLICIES, simulate, summarize
+
+
+class Command(BaseCommand):
+    help = 'Simulates War games for every cards_on_hand setting and prints ' \
+           'length, war event and draw statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=1_000_000)
+        parser.add_argument('--cards', type=int, nargs='+',
+                            default=list(range(1, 9)),
+                            help='cards_on_hand settings, 1-8 by default')
+        parser.add_argument('--policy', choices=POLICIES, default='random',
+                            help='card both players throw')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"cards":>5}{"moves":>7}{"draws":>8}{"wars":>7}'
+                          f'{"wars p95":>10}{"no war":>8}{"margin":>8}'
+                          f'{"margin p95":>12}{"unscored":>10}{"games/s":>10}')
+        for cards_on_hand in options['cards']:
+            started = time.perf_counter()
+            results = simulate(options['games'], cards_on_hand,
+                               options['policy'], options['seed'])
+            elapsed = time.perf_counter() - started
+            stats = summarize(results, cards_on_hand)
+            self.stdout.write(
+                f'{cards_on_hand:>5}{stats["moves"]:>7}'
+                f'{stats["draw_rate"]:>8.2%}{stats["war_events_mean"]:>7.2f}'
+                f'{stats["war_events_p95"]:>10.0f}{stats["no_war_rate"]:>8.2%}'
+                f'{stats["margin_mean"]:>8.2f}{stats["margin_p95"]:>12.0f}'
+                f'{stats["unscored_rate"]:>10.2%}'
+                f'{options["games"] / elapsed:>10.0f}')
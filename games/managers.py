@@ -10,12 +10,25 @@ class GameTypeQuerySet(SafeDeleteQueryset):
 
 
 class GameTypeManager(SafeDeleteManager):
+    # normalized type_name -> GameType, shared by the whole process,
+    # dropped by signals on every GameType save/delete
+    _registry = None
+
+    def registry(self):
+        registry = GameTypeManager._registry
+        if registry is None:
+            registry = {}
+            for typegame in self.get_queryset():
+                registry.setdefault(
+                    normalize_str(typegame.type_name).lower(), typegame)
+            GameTypeManager._registry = registry
+        return registry
+
+    def invalidate_registry(self):
+        GameTypeManager._registry = None
+
     def get_typegame_lower_nospecial(self, type_name):
-        for typegame in self.get_queryset():
-            print()
-            if normalize_str(typegame.type_name).lower() == type_name:
-                return typegame
-        # return self.get_queryset().get_typegame_lower_nospecial(type_name)
+        return self.registry().get(type_name)
 
 
 class GameQuerySet(models.QuerySet):
@@ -34,6 +47,22 @@ class GameQuerySet(models.QuerySet):
     def get_by_gameroom_id(self, gameroom_id):
         return self.filter(start_state__game_id=gameroom_id)
 
+    def get_user_games(self, userid):
+        return self.filter(participation__user=userid)
+
+    def get_page(self, cursor=None, limit=50):
+        """
+        Keyset page ordered by (datetime, pk) descending,
+        cursor is (datetime, pk) of the last game of the previous page
+        """
+        queryset = self.order_by('-datetime', '-pk')
+        if cursor is not None:
+            datetime, pk = cursor
+            queryset = queryset.filter(
+                models.Q(datetime__lt=datetime) | models.Q(pk__lt=pk),
+                datetime__lte=datetime)
+        return queryset[:limit]
+
 
 class GameManager(models.Manager):
     def get_queryset(self):
@@ -54,6 +83,12 @@ class GameManager(models.Manager):
     def get_by_gameroom_id(self, gameroom_id):
         return self.get_queryset().get_by_gameroom_id(gameroom_id)
 
+    def get_user_games(self, userid):
+        return self.get_queryset().get_user_games(userid)
+
+    def get_page(self, cursor=None, limit=50):
+        return self.get_queryset().get_page(cursor, limit)
+
 
 class ParticipationQuerySet(models.QuerySet):
     def get_by_userid_gametype(self, userid, gametype):
@@ -66,7 +101,6 @@ class ParticipationManager(models.Manager):
         return ParticipationQuerySet(self.model, using=self._db)
 
     def get_by_userid_gametype(self, userid, gametype):
-        print(gametype, userid)
         return self.get_queryset().get_by_userid_gametype(userid, gametype)
 
 
@@ -77,3 +111,24 @@ class MoveQuerySet(models.QuerySet):
 class MoveManager(models.Manager):
     def get_queryset(self):
         return MoveQuerySet(self.model, using=self._db)
+
+
+class PlayerStatsQuerySet(models.QuerySet):
+    def get_user_stats(self, userid):
+        return self.filter(user=userid)
+
+
+class PlayerStatsManager(models.Manager):
+    def get_queryset(self):
+        return PlayerStatsQuerySet(self.model, using=self._db)
+
+    def get_user_stats(self, userid):
+        return self.get_queryset().get_user_stats(userid)
+
+    def get_for_update(self, userid, gametype):
+        """
+        Locked stats row, created on the first game; use inside a transaction
+        """
+        stats, _ = self.get_queryset().select_for_update().get_or_create(
+            user=userid, game_type=gametype)
+        return stats
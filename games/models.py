@@ -1,8 +1,13 @@
 from django.db import models
 from django.db.models import manager
+from django.db.models.fields.json import KeyTransform
+from django.utils import timezone
 from safedelete.models import SafeDeleteModel, SOFT_DELETE
 from django.contrib.postgres.fields import ArrayField
-from .managers import GameManager, GameTypeManager, ParticipationManager, MoveManager
+from django.contrib.postgres.indexes import BrinIndex
+from .managers import GameManager, GameTypeManager, ParticipationManager, MoveManager, \
+    PlayerStatsManager
+from .move_log import iter_moves
 
 
 class GameType(SafeDeleteModel):
@@ -27,13 +32,27 @@ class Game(models.Model):
         on_delete=models.CASCADE,
     )
     datetime = models.DateTimeField(auto_now=True)
+    # packed moves written once at game end, see move_log.py
+    move_log = models.BinaryField(null=True, editable=False)
     objects = GameManager()
 
     def __str__(self):
         return str(self.pk) + ' (' + self.game_type.type_name + ')'
 
+    def moves(self):
+        return iter_moves(self.move_log)
+
     class Meta:
         ordering = ['-datetime']
+        indexes = [
+            # GameManager.get_by_gameroom_id
+            models.Index(KeyTransform('game_id', 'start_state'),
+                         name='game_room_id_idx'),
+            models.Index(fields=['-datetime', '-id'],
+                         name='game_datetime_idx'),
+            models.Index(fields=['game_type', '-datetime', '-id'],
+                         name='game_type_datetime_idx'),
+        ]
 
 
 class Participation(models.Model):
@@ -53,6 +72,12 @@ class Participation(models.Model):
     score = models.IntegerField(choices=ScoreTypes.choices)
     objects = ParticipationManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'game'],
+                         name='participation_user_game_idx'),
+        ]
+
     def __str__(self):
         return 'g' + str(self.game.pk) + '-u' + str(self.user)
 
@@ -64,7 +89,96 @@ class Move(models.Model):
     )
     action = models.CharField(max_length=6)
     move = models.CharField(max_length=6)
+    datetime = models.DateTimeField(default=timezone.now)
     objects = MoveManager
 
+    class Meta:
+        indexes = [
+            # moves are appended in time order, a BRIN index keeps time
+            # range scans cheap at a fraction of a btree size. It is no
+            # partitioning: no pruning, and retention is a DELETE
+            BrinIndex(fields=['datetime'], name='move_datetime_brin'),
+        ]
+
     def __str__(self):
         return str(self.participation) + ': ' + str(self.move)
+
+
+class PlayerStats(models.Model):
+    """
+    Per user and game type results, updated when a game's final scores
+    are written, so profiles and leaderboards read a single row
+    """
+    user = models.PositiveIntegerField()
+    game_type = models.ForeignKey(
+        GameType,
+        on_delete=models.CASCADE,
+    )
+    games = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    draws = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    wins_by_disconnect = models.PositiveIntegerField(default=0)
+    losses_by_disconnect = models.PositiveIntegerField(default=0)
+    # > 0 wins in a row, < 0 losses in a row
+    current_streak = models.IntegerField(default=0)
+    best_streak = models.PositiveIntegerField(default=0)
+    total_time_sec = models.PositiveIntegerField(default=0)
+    rating = models.IntegerField(null=True)
+    # rating engine state besides the rating, e.g. Glicko-2 deviation
+    rating_deviation = models.FloatField(null=True)
+    rating_volatility = models.FloatField(null=True)
+    objects = PlayerStatsManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'game_type'],
+                                    name='playerstats_user_gametype'),
+        ]
+
+    def __str__(self):
+        return 'u' + str(self.user) + ' (' + self.game_type.type_name + ')'
+
+    @property
+    def average_time_sec(self):
+        if self.games == 0:
+            return 0
+        return self.total_time_sec / self.games
+
+    def record_result(self, score, time_sec):
+        ScoreTypes = Participation.ScoreTypes
+        self.games += 1
+        self.total_time_sec += max(int(time_sec), 0)
+        if score == ScoreTypes.DRAW:
+            self.draws += 1
+            self.current_streak = 0
+        elif score in (ScoreTypes.WIN, ScoreTypes.WIN_BY_DISCONNECT):
+            if score == ScoreTypes.WIN:
+                self.wins += 1
+            else:
+                self.wins_by_disconnect += 1
+            self.current_streak = max(self.current_streak, 0) + 1
+            self.best_streak = max(self.best_streak, self.current_streak)
+        elif score in (ScoreTypes.LOSE, ScoreTypes.LOSE_BY_DISCONNECT):
+            if score == ScoreTypes.LOSE:
+                self.losses += 1
+            else:
+                self.losses_by_disconnect += 1
+            self.current_streak = min(self.current_streak, 0) - 1
+
+    def to_dict(self):
+        return {
+            'user': self.user,
+            'game_type': self.game_type.type_name,
+            'games': self.games,
+            'wins': self.wins,
+            'draws': self.draws,
+            'losses': self.losses,
+            'wins_by_disconnect': self.wins_by_disconnect,
+            'losses_by_disconnect': self.losses_by_disconnect,
+            'current_streak': self.current_streak,
+            'best_streak': self.best_streak,
+            'average_time_sec': self.average_time_sec,
+            'rating': self.rating,
+            'rating_deviation': self.rating_deviation,
+        }
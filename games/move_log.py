@@ -0,0 +1,42 @@
+from .classes.cards_utils import card_code, card_from_code
+
+# A finished game's moves packed into Game.move_log:
+#   [version] + [seat, action, card] per move, one byte each
+# seat is the chair index ('p1' -> 0), card is NO_CARD for moves without one
+MOVE_LOG_VERSION = 1
+MOVE_SIZE = 3
+NO_CARD = 255
+ACTIONS = ['take', 'throw', 'end', 'demand']
+
+
+def encode_move(chair, action, move=None):
+    """
+    ('p2', 'throw', '0H') -> [1, 1, 34]
+    """
+    card = card_code(move) if move else NO_CARD
+    return [int(chair[1:]) - 1, ACTIONS.index(action), card]
+
+
+def decode_move(seat, action, card):
+    move = card_from_code(card) if card != NO_CARD else None
+    return 'p' + str(seat + 1), ACTIONS[action], move
+
+
+def pack_moves(encoded_moves):
+    packed = bytearray([MOVE_LOG_VERSION])
+    for encoded in encoded_moves:
+        packed.extend(encoded)
+    return bytes(packed)
+
+
+def iter_moves(packed):
+    """
+    Lazily yields (chair, action, move) from a packed log
+    """
+    if not packed:
+        return
+    packed = memoryview(packed)
+    if packed[0] != MOVE_LOG_VERSION:
+        raise ValueError(f'Unsupported move log version {packed[0]}')
+    for i in range(1, len(packed), MOVE_SIZE):
+        yield decode_move(*packed[i:i + MOVE_SIZE])
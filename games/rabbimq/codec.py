@@ -0,0 +1,123 @@
+import os
+import json
+import msgpack
+
+# Wire format of every message exchanged with the ranking service.
+# v1 packs a message into a positional msgpack array:
+#   [version, kind, *fields]
+# and decodes back to the same dict shape the JSON messages had, so
+# callers never see the difference. Messages are sent as JSON unless
+# RABBITMQ_MESSAGE_FORMAT=msgpack: the ranking consumer outside this
+# repository reads JSON only until it is updated.
+SCHEMA_VERSION = 1
+MESSAGE_FORMAT = os.environ.get('RABBITMQ_MESSAGE_FORMAT', 'json')
+
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+JSON_CONTENT_TYPE = 'application/json'
+
+GAME_DATA = 1
+RANKING_REQUEST = 2
+USER_DATA = 3
+
+SCORES = ['win', 'draw', 'lose']
+
+
+def pack_game_data(jsonbody):
+    """
+    {'game_type': 'war', 'players': {id: {points, score, left, moves, time_sec}}}
+    -> ['war', [[id, points, score, left, moves, time_sec], ...]]
+    """
+    players = []
+    for user_id, info in jsonbody['players'].items():
+        players.append([int(user_id), info['points'], SCORES.index(info['score']),
+                        info['left'], info['moves'], info['time_sec']])
+    return [jsonbody['game_type'], players]
+
+
+def unpack_game_data(fields):
+    game_type, players = fields
+    jsonbody = {'game_type': game_type, 'players': {}}
+    for user_id, points, score, left, moves, time_sec in players:
+        jsonbody['players'][str(user_id)] = {
+            'points': points,
+            'score': SCORES[score],
+            'left': left,
+            'moves': moves,
+            'time_sec': time_sec,
+        }
+    return jsonbody
+
+
+def pack_ranking_request(jsonbody):
+    """
+    {'game_type': 'war', 'game_id': 'g1a2b', 'players': [id1, id2]}
+    -> ['war', 'g1a2b', [id1, id2]]
+    """
+    return [jsonbody['game_type'], jsonbody['game_id'],
+            [int(user_id) for user_id in jsonbody['players']]]
+
+
+def unpack_ranking_request(fields):
+    game_type, game_id, players = fields
+    return {'game_type': game_type, 'game_id': game_id, 'players': players}
+
+
+def pack_user_data(jsonbody):
+    """
+    {'game_name': 'war', 'game_id': 'g1a2b', 'players': {id: {nickname, rank}}}
+    -> ['war', 'g1a2b', [[id, nickname, rank], ...]]
+    """
+    players = []
+    for user_id, info in jsonbody['players'].items():
+        players.append([int(user_id), info['nickname'], info['rank']])
+    return [jsonbody['game_name'], jsonbody['game_id'], players]
+
+
+def unpack_user_data(fields):
+    game_name, game_id, players = fields
+    jsonbody = {'game_name': game_name, 'game_id': game_id, 'players': {}}
+    for user_id, nickname, rank in players:
+        jsonbody['players'][str(user_id)] = {
+            'nickname': nickname,
+            'rank': rank,
+        }
+    return jsonbody
+
+
+PACKERS = {
+    GAME_DATA: pack_game_data,
+    RANKING_REQUEST: pack_ranking_request,
+    USER_DATA: pack_user_data,
+}
+
+UNPACKERS = {
+    GAME_DATA: unpack_game_data,
+    RANKING_REQUEST: unpack_ranking_request,
+    USER_DATA: unpack_user_data,
+}
+
+
+def encode_message(jsonbody, kind, message_format=None):
+    """
+    return (body, content_type)
+    """
+    if (message_format or MESSAGE_FORMAT) == 'json':
+        return json.dumps(obj=jsonbody), JSON_CONTENT_TYPE
+    fields = PACKERS[kind](jsonbody)
+    return msgpack.packb([SCHEMA_VERSION, kind, *fields]), MSGPACK_CONTENT_TYPE
+
+
+def decode_message(body, content_type=None):
+    """
+    Accepts both msgpack and legacy JSON bodies. Without a content type
+    a body starting with '{' is treated as JSON.
+    """
+    if isinstance(body, str):
+        body = body.encode()
+    if content_type == JSON_CONTENT_TYPE \
+            or (content_type is None and body[:1] == b'{'):
+        return json.loads(body)
+    version, kind, *fields = msgpack.unpackb(body)
+    if version != SCHEMA_VERSION:
+        raise ValueError(f'Unsupported message schema version {version}')
+    return UNPACKERS[kind](fields)
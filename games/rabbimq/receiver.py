@@ -1,10 +1,11 @@
 import pika
 import logging
 from ..redis_utils import redis
+from .codec import decode_message
 
 
 def callback_receive_rankings(ch, method, properties, body):
-    body = body.decode()
+    body = decode_message(body, properties.content_type)
     logging.log(logging.INFO, f"Received {body}")
     
     pass
@@ -1,5 +1,5 @@
 import pika
-import json
+from .codec import encode_message, GAME_DATA, RANKING_REQUEST
 
 # set to rabbitmq, port
 # connection = pika.BlockingConnection(
@@ -14,7 +14,8 @@ def send_ranking_request(jsonbody):
         'players': [id1, id2]
     }
     """
-    send_to_rabbitmq(jsonbody, queue_name='receive_user_data_queue')
+    send_to_rabbitmq(jsonbody, queue_name='receive_user_data_queue',
+                     kind=RANKING_REQUEST)
 
 
 def send_game_data(jsonbody):
@@ -42,16 +43,18 @@ def send_game_data(jsonbody):
         }
     }
     """
-    send_to_rabbitmq(jsonbody, queue_name='receive_ranking_queue')
+    send_to_rabbitmq(jsonbody, queue_name='receive_ranking_queue',
+                     kind=GAME_DATA)
 
 
-def send_to_rabbitmq(jsonbody, queue_name):
+def send_to_rabbitmq(jsonbody, queue_name, kind):
     # set to rabbitmq, port
     connection = pika.BlockingConnection(
         pika.ConnectionParameters(host='rabbitmq'))
     channel = connection.channel()
     channel.queue_declare(queue=queue_name, durable=True)
-    print(json.dumps(obj=jsonbody))
+    body, content_type = encode_message(jsonbody, kind)
     channel.basic_publish(
-        exchange='', routing_key=queue_name, body=json.dumps(obj=jsonbody))
+        exchange='', routing_key=queue_name, body=body,
+        properties=pika.BasicProperties(content_type=content_type))
     connection.close()
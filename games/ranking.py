@@ -1,6 +1,11 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
 WIN = 1
 DRAW = 0.5
 LOSE = 0
+ELO_K = 100
+GLICKO2_SCALE = 173.7178
 
 def expected_score(rating_a, rating_b):
     return 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
@@ -23,3 +28,224 @@ def calculate_elo(player_rank:int, opponent_ranks:list, score:int, k:int):
     return elo(player_rank, exp_score, score, k)
 
 
+def calculate_elo_batch(ratings, scores, k):
+    """
+    All players of one game at once, each one against all the others
+    ratings = [1300, 1100, 1200]
+    scores = [WIN, LOSE, LOSE]
+    print(calculate_elo_batch(ratings, scores, 10))
+    # [1296.00188074, 1093.99811926, 1190.]
+    """
+    ratings = np.asarray(ratings, dtype=float)
+    # exp_scores[i][j] = expected_score(ratings[i], ratings[j])
+    exp_scores = 1 / (1 + 10 ** ((ratings[np.newaxis, :] - ratings[:, np.newaxis]) / 400))
+    np.fill_diagonal(exp_scores, 0)
+    return ratings + k * (np.asarray(scores, dtype=float) - exp_scores.sum(axis=1))
+
+
+
+def calculate_glicko2_batch(ratings, deviations, volatilities, outcomes,
+                            tau=0.5, center=1500):
+    """
+    Glicko-2 update of players treating their games as one rating period.
+    outcomes[i][j] = result of i against j (1, 0.5, 0), nan if they did not
+    play; every player needs at least one result.
+    Example from Glickman's paper, first player:
+    outcomes = [[nan, 1, 0, 0], [0, nan, nan, nan], [1, nan, nan, nan], [1, nan, nan, nan]]
+    calculate_glicko2_batch([1500, 1400, 1550, 1700], [200, 30, 100, 300],
+                            [0.06] * 4, outcomes)[0]
+    # [1464.05, 151.52, 0.05999]
+    """
+    mu = (np.asarray(ratings, dtype=float) - center) / GLICKO2_SCALE
+    phi = np.asarray(deviations, dtype=float) / GLICKO2_SCALE
+    sigma = np.asarray(volatilities, dtype=float)
+    outcomes = np.asarray(outcomes, dtype=float)
+    played = ~np.isnan(outcomes)
+
+    g = 1 / np.sqrt(1 + 3 * phi ** 2 / np.pi ** 2)
+    # expected[i][j] = expected result of i against j
+    expected = 1 / (1 + np.exp(-g[np.newaxis, :] * (mu[:, np.newaxis] - mu[np.newaxis, :])))
+    v = 1 / np.where(played, g ** 2 * expected * (1 - expected), 0).sum(axis=1)
+    delta = v * np.where(played, g * (np.nan_to_num(outcomes) - expected), 0).sum(axis=1)
+
+    sigma = glicko2_volatility(phi, sigma, v, delta, tau)
+    phi_star = np.sqrt(phi ** 2 + sigma ** 2)
+    phi = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v)
+    mu = mu + phi ** 2 * delta / v
+    return np.column_stack([mu * GLICKO2_SCALE + center,
+                            phi * GLICKO2_SCALE,
+                            sigma])
+
+
+def glicko2_volatility(phi, sigma, v, delta, tau, epsilon=1e-6, iterations=100):
+    """
+    Illinois algorithm of Glicko-2 step 5, run for all players at once
+    """
+    a = np.log(sigma ** 2)
+
+    def f(x):
+        ex = np.exp(x)
+        return ex * (delta ** 2 - phi ** 2 - v - ex) \
+            / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+
+    big_change = delta ** 2 > phi ** 2 + v
+    lower = np.where(big_change,
+                     np.log(np.where(big_change, delta ** 2 - phi ** 2 - v, 1)),
+                     a - tau)
+    while True:
+        below = ~big_change & (f(lower) < 0)
+        if not below.any():
+            break
+        lower = np.where(below, lower - tau, lower)
+
+    upper = a
+    f_upper, f_lower = f(upper), f(lower)
+    for _ in range(iterations):
+        active = np.abs(lower - upper) > epsilon
+        if not active.any():
+            break
+        with np.errstate(divide='ignore', invalid='ignore'):
+            c = upper + (upper - lower) * f_upper / (f_lower - f_upper)
+        c = np.where(active, c, lower)
+        f_c = f(c)
+        swap = active & (f_c * f_lower <= 0)
+        upper = np.where(swap, lower, upper)
+        f_upper = np.where(swap, f_lower, np.where(active, f_upper / 2, f_upper))
+        lower = np.where(active, c, lower)
+        f_lower = np.where(active, f_c, f_lower)
+    return np.exp(upper / 2)
+
+
+def table_outcomes(scores):
+    """
+    Results of every pair of players of one game, players with a higher
+    score finished above: outcomes[i][j] = 1, 0.5 or 0, nan on the diagonal
+    """
+    scores = np.asarray(scores, dtype=float)
+    outcomes = (np.sign(scores[:, np.newaxis] - scores[np.newaxis, :]) + 1) / 2
+    np.fill_diagonal(outcomes, np.nan)
+    return outcomes
+
+
+class RatingEngine(ABC):
+    """
+    Rates all players of one game at once. A player state is a row of
+    FIELDS values, rating first; update() takes the states of a table as
+    a (players, fields) array and returns the new ones
+    """
+    name = None
+    FIELDS = ('rating',)
+
+    def __init__(self, initial_rating=1000):
+        self.initial_rating = initial_rating
+
+    def defaults(self):
+        return np.array([self.initial_rating], dtype=float)
+
+    def state(self, rating, params=None):
+        """
+        State row from a rating and the stored {field: value} of the rest
+        """
+        row = self.defaults()
+        row[0] = rating
+        for i, field in enumerate(self.FIELDS[1:], start=1):
+            if params and params.get(field) is not None:
+                row[i] = params[field]
+        return row
+
+    def params(self, row):
+        return {field: float(value)
+                for field, value in zip(self.FIELDS[1:], row[1:])}
+
+    @abstractmethod
+    def update(self, states, scores):
+        pass
+
+
+class Elo(RatingEngine):
+    name = 'elo'
+
+    def __init__(self, initial_rating=1000, k=ELO_K):
+        super().__init__(initial_rating)
+        self.k = k
+
+    def update(self, states, scores):
+        states = np.asarray(states, dtype=float)
+        return calculate_elo_batch(states[:, 0], scores, self.k)[:, np.newaxis]
+
+
+class Glicko2(RatingEngine):
+    """
+    Every game is its own rating period, each player playing all the
+    others: a 4 player game is 6 pairwise results
+    """
+    name = 'glicko2'
+    FIELDS = ('rating', 'deviation', 'volatility')
+
+    def __init__(self, initial_rating=1000, deviation=350, volatility=0.06, tau=0.5):
+        super().__init__(initial_rating)
+        self.deviation = deviation
+        self.volatility = volatility
+        self.tau = tau
+
+    def defaults(self):
+        return np.array([self.initial_rating, self.deviation, self.volatility],
+                        dtype=float)
+
+    def update(self, states, scores):
+        states = np.asarray(states, dtype=float)
+        if len(states) < 2:
+            return states
+        return calculate_glicko2_batch(
+            states[:, 0], states[:, 1], states[:, 2], table_outcomes(scores),
+            self.tau, self.initial_rating)
+
+
+ENGINES = {engine.name: engine for engine in (Elo, Glicko2)}
+
+
+def get_engine(name, **params):
+    if name not in ENGINES:
+        raise Exception('Rating engine does not exist')
+    return ENGINES[name](**params)
+
+
+class RatingReplay:
+    """
+    States of many players kept in one numpy array,
+    fed with games in chronological order
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        # user id -> row in self.states
+        self.index = {}
+        self.states = np.tile(engine.defaults(), (1024, 1))
+
+    def positions(self, users):
+        positions = []
+        for user in users:
+            if user not in self.index:
+                self.index[user] = len(self.index)
+                if len(self.index) > len(self.states):
+                    self.states = np.concatenate([
+                        self.states,
+                        np.tile(self.engine.defaults(), (len(self.states), 1))])
+            positions.append(self.index[user])
+        return np.array(positions)
+
+    def play(self, users, scores):
+        """
+        users = [user_id, ...], scores = [WIN | DRAW | LOSE, ...] of one game
+        """
+        positions = self.positions(users)
+        self.states[positions] = self.engine.update(self.states[positions], scores)
+
+    def rating(self, user):
+        return self.states[self.index[user], 0]
+
+    def all_states(self):
+        """
+        {user: state row}
+        """
+        return {user: self.states[i] for user, i in self.index.items()}
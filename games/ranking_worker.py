@@ -1,7 +1,7 @@
 import pika
 import os
-import json
 from rejson import Client
+from rabbimq.codec import decode_message
 
 REDIS_HOST = os.environ.get('REDIS_HOST')
 REDIS_PORT = os.environ.get('REDIS_PORT')
@@ -24,7 +24,7 @@ def callback_receive_rankings(ch, method, properties, body):
     }
     """
     try:
-        body = json.loads(body)
+        body = decode_message(body, properties.content_type)
         game_path = body['game_name'] + '.' + str(body['game_id'])
         print(f"Received {body}")
         for player_id in body['players'].keys():
@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+from importlib.metadata import entry_points
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .game_config import GameConfig
+
+# Game types by name ('war' -> games.classes.war.War), from
+# settings.GAME_TYPES and the 'gameserver.games' entry points of
+# installed packages (settings win on a clash). A class is imported,
+# and its config parsed and compiled (game_config), the first time the
+# type is used; both are kept for the life of the process.
+ENTRY_POINT_GROUP = 'gameserver.games'
+# configs of the games bundled with this package
+CONFIGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'games_configs')
+
+_sources = None
+_classes = {}
+_configs = {}
+
+
+def game_sources():
+    """
+    {name: dotted path or entry point}, collected once
+    """
+    global _sources
+    if _sources is None:
+        found = entry_points()
+        if hasattr(found, 'select'):
+            found = found.select(group=ENTRY_POINT_GROUP)
+        else:
+            found = found.get(ENTRY_POINT_GROUP, [])
+        sources = {entry_point.name: entry_point for entry_point in found}
+        sources.update(settings.GAME_TYPES)
+        _sources = sources
+    return _sources
+
+
+def game_types():
+    return list(game_sources())
+
+
+def config_path(game_type, game_class):
+    """
+    Game.config_path of the class, relative to its module, or
+    CONFIGS_DIR/<name>.json for the games bundled with this package
+    """
+    if game_class.config_path is not None:
+        if os.path.isabs(game_class.config_path):
+            return game_class.config_path
+        module_dir = os.path.dirname(sys.modules[game_class.__module__].__file__)
+        return os.path.join(module_dir, game_class.config_path)
+    if game_class.__module__.split('.')[0] != __name__.split('.')[0]:
+        raise Exception(f'{game_type} game class has no config_path')
+    return os.path.join(CONFIGS_DIR, f'{game_type}.json')
+
+
+def register(game_type, game_class):
+    with open(config_path(game_type, game_class)) as json_file:
+        _configs[game_type] = GameConfig(json.load(json_file))
+    _classes[game_type] = game_class
+
+
+def get_class(game_type):
+    if game_type not in _classes:
+        source = game_sources().get(game_type)
+        if source is None:
+            raise Exception('Gametype does not exist')
+        register(game_type, import_string(source)
+                 if isinstance(source, str) else source.load())
+    return _classes[game_type]
+
+
+def get_config(game_type):
+    """
+    game_config.GameConfig of the type
+    """
+    get_class(game_type)
+    return _configs[game_type]
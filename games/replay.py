@@ -0,0 +1,70 @@
+from .models import Move, Participation
+from .resources import normalize_str
+from .classes.games_handler import get_class
+from .engine.replay import replay
+
+MOVES_CHUNK = 500
+
+
+def iter_move_rows(game, chairs):
+    """
+    Move rows of a game in insertion order, read in keyset chunks
+    """
+    participations = dict(Participation.objects.filter(
+        game=game).values_list('pk', 'user'))
+    last_pk = 0
+    while True:
+        chunk = list(Move.objects.filter(
+            participation__game=game, pk__gt=last_pk
+        ).order_by('pk').values_list(
+            'pk', 'participation', 'action', 'move')[:MOVES_CHUNK])
+        for pk, participation, action, move in chunk:
+            yield chairs[participations[participation]], action, move or None
+        if len(chunk) < MOVES_CHUNK:
+            return
+        last_pk = chunk[-1][0]
+
+
+def iter_game_moves(game, chairs):
+    if game.move_log:
+        return game.moves()
+    return iter_move_rows(game, chairs)
+
+
+def replay_events(game):
+    """
+    {'type': 'start', 'data': initial_state}, then
+    {'type': 'move', 'data': {'number', 'chair', 'action', 'move', 'applied', 'state'}}
+    per move, state = the position after it re-executed by the rules engine.
+    The moves are read from the database here, iterating the events runs
+    no queries: under ASGI a streamed response is iterated in the event loop
+    """
+    game_class = get_class(normalize_str(game.game_type.type_name).lower())
+    initial_state = game_class.initial_state(game.start_state)
+    chairs = {values['id']: chair
+              for chair, values in initial_state['players'].items()}
+    moves = list(iter_game_moves(game, chairs))
+    return iter_replay_events(game_class, initial_state, moves)
+
+
+def iter_replay_events(game_class, initial_state, moves):
+    yield {'type': 'start', 'data': initial_state}
+
+    if game_class.state_class is None:
+        moves = ((chair, action, move, None) for chair, action, move in moves)
+        state = None
+    else:
+        state = game_class.state_class.from_room(initial_state)
+        moves = replay(state, moves)
+    for number, (chair, action, move, applied) in enumerate(moves):
+        yield {
+            'type': 'move',
+            'data': {
+                'number': number,
+                'chair': chair,
+                'action': action,
+                'move': move,
+                'applied': applied,
+                'state': state.to_room() if state is not None else None,
+            },
+        }
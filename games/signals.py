@@ -0,0 +1,9 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import GameType
+
+
+@receiver(post_save, sender=GameType)
+@receiver(post_delete, sender=GameType)
+def invalidate_gametype_registry(sender, **kwargs):
+    GameType.objects.invalidate_registry()
@@ -4,6 +4,7 @@ from datetime import datetime
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from .redis_utils import redis_all_gametypes, redis_all_games_ids
+from .write_behind import flush_all, flush_game, has_pending_writes
 from .classes.games_handler import get_all_chairs, ping_game, \
     try_finish_game_by_undertime, delete_game, any_update_in_game, \
     any_userscores_to_send
@@ -44,6 +45,19 @@ def delete_empty_lobbies():
         for id in redis_all_games_ids(game_type):
             try:
                 if len(get_all_chairs(game_type, id)) == 0:
-                    delete_game(game_type, id)
+                    # queued writes read participation ids from the room
+                    flush_game(game_type, id)
+                    if not has_pending_writes(game_type, id):
+                        delete_game(game_type, id)
             except:
                 pass
+
+
+@shared_task
+def flush_write_behind():
+    return flush_all()
+
+
+@shared_task
+def flush_game_writes(game_type, game_id):
+    return flush_game(game_type, game_id)
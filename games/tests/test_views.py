@@ -1,12 +1,20 @@
 import json
 from xml.etree.ElementTree import XML, Element
 from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotFound, JsonResponse, request
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.test import TestCase, AsyncClient
+from django.urls import reverse
 from django.core import management
 
 from ..models import GameType, Game
 from ..redis_utils import redis_all_games_ids
-from ..views import game_info, game_lobbies, games, game_create, lobby_info, metadata, saml_view
+from ..views import game_info, game_lobbies, games, game_create, lobby_info, metadata, saml_view, \
+    game_replay, game_history, user_history, leaderboard_top, leaderboard_around
+from ..models import Participation, Move
+from django.http import QueryDict
+from ..classes.cards_utils import to_strings
+from ..engine.state import deal
+from ..move_log import encode_move, pack_moves
 from ..classes.games_handler import connect_to_game, delete_game
 from .consts import WAR, WAR_BASE_CONFIG
 
@@ -34,6 +42,122 @@ class GameTypeModelTests(TestCase):
             start_state=''
         )
 
+    def test_game_replay(self):
+        params = WAR_BASE_CONFIG['game_parameters']
+        hands, deck, _ = deal(['p1', 'p2'], params['cards_on_hand'], 7)
+        hands = {chair: to_strings(hand) for chair, hand in hands.items()}
+        game = Game.objects.create(
+            game_type=self.war,
+            start_state={
+                'v': 2,
+                'game_id': 'g1234',
+                'params': params,
+                'seats': [['p1', 1], ['p2', 2]],
+                'starting_player': 'p1',
+                'seed': 7,
+            },
+            move_log=pack_moves([encode_move('p1', 'throw', hands['p1'][0]),
+                                 encode_move('p1', 'take'),
+                                 encode_move('p2', 'throw', hands['p2'][0])]),
+        )
+        response = game_replay(request.HttpRequest(), game.pk)
+        events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual(events[0]['type'], 'start')
+        self.assertEqual(events[0]['data']['players']['p1']['hand'], hands['p1'])
+        self.assertEqual(events[0]['data']['stack_draw'], to_strings(deck))
+        self.assertEqual([event['data']['move'] for event in events[1:]],
+                         [hands['p1'][0], None, hands['p2'][0]])
+        self.assertEqual(events[3]['data']['chair'], 'p2')
+        self.assertTrue(all(event['data']['applied'] for event in events[1:]))
+        self.assertEqual(events[1]['data']['state']['stack_throw'], [hands['p1'][0]])
+        # seed 7 deals 7C to p1 and QD to p2
+        self.assertEqual(events[3]['data']['state']['players']['p2']['points'], 2)
+
+    def create_game_with_move_rows(self):
+        params = WAR_BASE_CONFIG['game_parameters']
+        hands, _, _ = deal(['p1', 'p2'], params['cards_on_hand'], 7)
+        game = Game.objects.create(
+            game_type=self.war,
+            start_state={
+                'v': 2,
+                'game_id': 'g1234',
+                'params': params,
+                'seats': [['p1', 1], ['p2', 2]],
+                'starting_player': 'p1',
+                'seed': 7,
+            },
+        )
+        participations = {
+            chair: Participation.objects.create(
+                user=user, game=game, score=Participation.ScoreTypes.DRAW)
+            for chair, user in (('p1', 1), ('p2', 2))}
+        # the thrower takes a card before the turn passes
+        moves = [('p1', 'throw', to_strings(hands['p1'])[0]), ('p1', 'take', None),
+                 ('p2', 'throw', to_strings(hands['p2'])[0])]
+        for chair, action, move in moves:
+            Move.objects.create(participation=participations[chair],
+                                action=action, move=move or '')
+        return game, moves
+
+    async def test_game_replay_asgi(self):
+        # under ASGI the streamed events are iterated in the event loop
+        game, moves = await sync_to_async(self.create_game_with_move_rows)()
+        response = await AsyncClient().get(reverse('game_replay', args=[game.pk]))
+        events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual([(event['data']['chair'], event['data']['action'], event['data']['move'])
+                          for event in events[1:]], moves)
+        self.assertTrue(all(event['data']['applied'] for event in events[1:]))
+
+    def test_game_history_pages(self):
+        req = request.HttpRequest()
+        req.GET = QueryDict('limit=2')
+        page = json.loads(game_history(req).content)
+        self.assertEqual([game['pk'] for game in page['games']],
+                         [self.game3.pk, self.game2.pk])
+
+        req.GET = QueryDict(f"limit=2&cursor={page['next']}")
+        page = json.loads(game_history(req).content)
+        self.assertEqual([game['pk'] for game in page['games']], [self.game1.pk])
+        self.assertIsNone(page['next'])
+
+    def test_game_history_limit(self):
+        req = request.HttpRequest()
+        for limit in ('0', '-5', '201'):
+            req.GET = QueryDict(f'limit={limit}')
+            self.assertEqual(type(game_history(req)), HttpResponseBadRequest)
+            self.assertEqual(type(user_history(req, 7)), HttpResponseBadRequest)
+
+    def test_leaderboard_limit(self):
+        req = request.HttpRequest()
+        for limit in ('0', '-5'):
+            req.GET = QueryDict(f'limit={limit}')
+            self.assertEqual(type(leaderboard_top(req, WAR)), HttpResponseBadRequest)
+            req.GET = QueryDict(f'rating=1000&count={limit}')
+            self.assertEqual(type(leaderboard_around(req, WAR)), HttpResponseBadRequest)
+
+    def test_game_history_game_type(self):
+        req = request.HttpRequest()
+        req.GET = QueryDict(f'game_type={WAR}')
+        page = json.loads(game_history(req).content)
+        self.assertEqual([game['game_type'] for game in page['games']], [WAR])
+
+        req.GET = QueryDict('game_type=other_')
+        self.assertEqual(type(game_history(req)), HttpResponseBadRequest)
+
+    def test_user_history(self):
+        Participation.objects.create(user=7, game=self.game1,
+                                     score=Participation.ScoreTypes.WIN)
+        req = request.HttpRequest()
+        page = json.loads(user_history(req, 7).content)
+        self.assertEqual(page['games'][0]['pk'], self.game1.pk)
+        self.assertEqual(page['games'][0]['score'], Participation.ScoreTypes.WIN)
+
+    def test_game_replay_not_exist(self):
+        response = game_replay(request.HttpRequest(), 0)
+        self.assertEqual(type(response), HttpResponseNotFound)
+
     def test_games_view(self):
         games_json = games({})._container[0]
         games_dict = json.loads(games_json)
@@ -51,6 +175,18 @@ class GameTypeModelTests(TestCase):
         with open(f'games/games_configs/{WAR}.json') as json_file:
             self.assertEquals(config_json, json.load(json_file))
 
+    def test_create_game_get_etag(self):
+        req = request.HttpRequest()
+        req.method = 'GET'
+        etag = game_create(req, WAR)['ETag']
+
+        req = request.HttpRequest()
+        req.method = 'GET'
+        req.META['HTTP_IF_NONE_MATCH'] = etag
+        response = game_create(req, WAR)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
     def test_create_game_get_not_exist(self):
         req = request.HttpRequest()
         req.method = 'GET'
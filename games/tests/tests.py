@@ -1,5 +1,7 @@
 import datetime
 import json
+import os
+import random
 from unittest.mock import patch
 from django.test import TestCase
 from django.core import management
@@ -7,14 +9,31 @@ from games.classes.game import FINISHED
 
 from games.classes.war import War
 from games.classes.makao import Makao
-from ..models import GameType, Game
-from ..ranking import calculate_elo
+from ..models import GameType, Game, Participation, Move, PlayerStats
+from ..ranking import calculate_elo, calculate_elo_batch, calculate_glicko2_batch, \
+    Elo, Glicko2, RatingReplay
 from ..classes.games_handler import create_game, current_username, delete_game, \
     disconnect_from_game, game_self_info, get_all_chairs, get_all_players, try_finish_game_by_undertime, \
-    get_class, connect_to_game, get_finish_score, is_game_ongoing, make_move, mark_active, \
+    get_class, connect_to_game, get_finish_score, is_game_finished, is_game_ongoing, make_move, mark_active, \
     mark_ready, ping_game, possible_moves, start_game, start_game_possible, surrender
 from ..redis_utils import redis, redis_all_games_ids, redis_all_gametypes, redis_list_from_dict
-from .consts import SURRENDER, WAR, MAKAO, WAR_BASE_CONFIG, GAMES_CONFIG_PATH
+from ..rabbimq.codec import encode_message, decode_message, GAME_DATA, RANKING_REQUEST, \
+    USER_DATA, JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE, SCHEMA_VERSION
+from ..write_behind import flush_game, queue_name, enqueue, MOVE, DEAD_LETTERS
+from ..game_config import GameConfig
+from ..registry import CONFIGS_DIR, config_path
+from ..move_log import encode_move, pack_moves, iter_moves
+from ..engine.war import WarState
+from ..engine.store import save_state
+from ..engine.makao import MakaoState, starting_pile
+from ..engine.state import deal
+from ..engine.replay import replay, state_at
+from ..engine.war_simulator import simulate, summarize
+from ..classes.cards_utils import FULL_DECK_MASK, card_code, card_from_code, card_rank, cards_mask, cards_prefix, \
+    compare_ranks, mask_codes, new_deck, shuffled_deck, to_codes, to_strings
+from ..leaderboard import set_rating, top, player_rank, around_rating, leaderboard_name, \
+    NICKNAMES
+from .consts import SURRENDER, WAR, MAKAO, WAR_BASE_CONFIG, GAMES_CONFIG_PATH, WAITING
 
 # Create your tests here.
 
@@ -46,6 +65,16 @@ class GameTypeModelTests(TestCase):
         self.assertEqual(
             GameType.objects.get_typegame_lower_nospecial('war'), self.gametype)
 
+    def test_gametype_registry_invalidation(self):
+        self.assertIsNone(
+            GameType.objects.get_typegame_lower_nospecial('makao'))
+        makao = GameType.objects.create(type_name='Makao')
+        self.assertEqual(
+            GameType.objects.get_typegame_lower_nospecial('makao'), makao)
+        makao.delete()
+        self.assertIsNone(
+            GameType.objects.get_typegame_lower_nospecial('makao'))
+
 
 class GameModelTests(TestCase):
     @classmethod
@@ -122,6 +151,47 @@ class RankingTests(TestCase):
         self.assertEqual(int(calculate_elo(p_rank, opponents, score, k)), 1097)
 
 
+class BatchRankingTests(TestCase):
+    def test_batch_matches_pairwise(self):
+        ratings = [1100, 1300, 1400, 1000]
+        scores = [1, 0, 0.5, 0]
+        new_ratings = calculate_elo_batch(ratings, scores, 12)
+        for i, rating in enumerate(ratings):
+            opponents = ratings[:i] + ratings[i + 1:]
+            self.assertAlmostEqual(new_ratings[i], calculate_elo(rating, opponents, scores[i], 12))
+
+    def test_batch_equal_ratings(self):
+        new_ratings = calculate_elo_batch([1200, 1200], [1, 0], 10)
+        self.assertEqual(list(new_ratings), [1205, 1195])
+
+    def test_engine_replays_games(self):
+        replay = RatingReplay(Elo(1200, 10))
+        replay.play([7, 3], [1, 0])
+        replay.play([3, 9], [0.5, 0.5])
+        self.assertEqual(replay.rating(7), 1205)
+        self.assertAlmostEqual(replay.rating(3),
+                               calculate_elo_batch([1195, 1200], [0.5, 0.5], 10)[0])
+        self.assertEqual(len(replay.all_states()), 3)
+
+    def test_glicko2_paper_example(self):
+        nan = float('nan')
+        outcomes = [[nan, 1, 0, 0], [0, nan, nan, nan], [1, nan, nan, nan], [1, nan, nan, nan]]
+        rating, deviation, volatility = calculate_glicko2_batch(
+            [1500, 1400, 1550, 1700], [200, 30, 100, 300], [0.06] * 4, outcomes)[0]
+        self.assertAlmostEqual(rating, 1464.05, places=1)
+        self.assertAlmostEqual(deviation, 151.52, places=1)
+        self.assertAlmostEqual(volatility, 0.05999, places=4)
+
+    def test_glicko2_table(self):
+        engine = Glicko2()
+        new_states = engine.update([engine.defaults()] * 4, [1, 0, 0, 0])
+        self.assertGreater(new_states[0][0], engine.initial_rating)
+        # losers of one table stay level with each other
+        self.assertAlmostEqual(new_states[1][0], new_states[3][0])
+        self.assertLess(new_states[1][0], engine.initial_rating)
+        self.assertTrue(all(new_states[:, 1] < engine.deviation))
+
+
 class CreateGameTests(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -212,22 +282,22 @@ class CreateGameTests(TestCase):
             'is_ranked': True,
             # no cards_on_hand
         }
-        with self.assertRaises(Exception) as context:
-            create_game(self.game, self.user_config)
+        id = create_game(self.game, self.user_config)
+        self.assertIsNotNone(id)
+        self.assertEqual(self.user_config['game_parameters']['cards_on_hand'],
+                         self.game_config['game_params'][0]['param_setup']['default'])
 
     @patch('games.classes.game.redis.jsontype', side_effect=[True, False])
     def test_create_game_with_same_id(self, id):
         create_game(self.game, self.user_config)
 
-    @patch('games.classes.game.Game.get_config_json', side_effect=[
-        {
-            'time_per_player': {
-                'type': 'non_existing_type',
-                'min': '0:15',
-                'max': '60:00'
-            }
+    @patch('games.classes.game.get_config', side_effect=lambda game_type: GameConfig({
+        'time_per_player': {
+            'type': 'non_existing_type',
+            'min': '0:15',
+            'max': '60:00'
         }
-    ])
+    }))
     def test_create_game_non_existing_type(self, id):
         with self.assertRaises(Exception) as context:
             create_game(self.game, self.user_config)
@@ -238,6 +308,27 @@ class CreateGameTests(TestCase):
             create_game(self.game, self.user_config)
 
 
+class GameConfigTests(TestCase):
+    def test_compile(self):
+        with open(f'{GAMES_CONFIG_PATH}{WAR}.json') as json_file:
+            config = GameConfig(json.load(json_file))
+        self.assertEqual(config.defaults['time_per_player'], 120)
+        self.assertEqual(config.defaults['cards_on_hand'], 3)
+        self.assertEqual(json.loads(config.body), config.source)
+
+    def test_validate(self):
+        with open(f'{GAMES_CONFIG_PATH}{WAR}.json') as json_file:
+            config = GameConfig(json.load(json_file))
+        params = dict(WAR_BASE_CONFIG['game_parameters'], cards_on_hand='4')
+        self.assertEqual(config.validate(params)['cards_on_hand'], 4)
+        for name, value in [('cards_on_hand', 9), ('time_per_player', 5), ('is_ranked', 'no')]:
+            with self.assertRaises(Exception):
+                config.validate(dict(params, **{name: value}))
+        self.assertEqual(config.validate({})['cards_on_hand'], 3)
+        for value, expected in [('false', False), ('True', True), (0, False), (True, True)]:
+            self.assertIs(config.validate(dict(params, is_ranked=value))['is_ranked'], expected)
+
+
 class GameDeleteTests(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -265,6 +356,28 @@ class GetClassTests(TestCase):
         with self.assertRaises(Exception) as context:
             get_class('other')
 
+    def test_get_class_config_parsed_once(self):
+        get_class(WAR)
+        with patch('games.registry.open', create=True) as open_file:
+            self.assertEqual(War.get_config_json()['max_players']['max'], 2)
+            self.assertEqual(get_class(WAR), War)
+            open_file.assert_not_called()
+
+    def test_config_path(self):
+        self.assertEqual(config_path(WAR, War), os.path.join(CONFIGS_DIR, 'war.json'))
+        self.assertTrue(os.path.isfile(config_path(WAR, War)))
+
+        plugin = type('Plugin', (War,), {'__module__': __name__, 'config_path': 'plugin.json'})
+        self.assertEqual(config_path('plugin', plugin),
+                         os.path.join(os.path.dirname(__file__), 'plugin.json'))
+        plugin.config_path = '/srv/plugin.json'
+        self.assertEqual(config_path('plugin', plugin), '/srv/plugin.json')
+
+        # only the bundled games fall back to games_configs
+        plugin = type('Plugin', (War,), {'__module__': 'plugin_games.plugin'})
+        with self.assertRaises(Exception):
+            config_path('plugin', plugin)
+
 
 class GameOperationTests(TestCase):
     @classmethod
@@ -355,6 +468,12 @@ class GameOperationTests(TestCase):
         scores = get_finish_score(WAR, self.game_id)
         self.assertEqual(scores['reason'], SURRENDER)
 
+    def test_lobby_not_finished(self):
+        self.assertIs(is_game_finished(WAR, self.game_id), False)
+        connect_to_game(WAR, self.game_id, self.user1_data)
+        connect_to_game(WAR, self.game_id, self.user2_data)
+        self.assertIs(is_game_finished(WAR, self.game_id), False)
+
     def test_pings_game_waiting(self):
         connect_to_game(WAR, self.game_id, self.user1_data)
         connect_to_game(WAR, self.game_id, self.user2_data)
@@ -437,6 +556,142 @@ class GameOperationTests(TestCase):
         self.assertEqual(len(game_info['stack_draw']), 0)
         self.assertEqual(game_info['status'], FINISHED)
 
+    def test_possible_moves_cache(self):
+        connect_to_game(WAR, self.game_id, self.user1_data)
+        connect_to_game(WAR, self.game_id, self.user2_data)
+        mark_ready(WAR, self.game_id, self.user1, True)
+        mark_ready(WAR, self.game_id, self.user2, True)
+        start_game(WAR, self.game_id)
+
+        user = current_username(WAR, self.game_id)
+        moves = possible_moves(WAR, self.game_id, user)
+        # the same version is served from the cache, the move is not validated again
+        with patch.object(WarState, 'legal_moves') as legal_moves:
+            self.assertEqual(possible_moves(WAR, self.game_id, user), moves)
+            self.assertTrue(make_move(WAR, self.game_id, user, 'throw',
+                                      moves['possible_moves'][0]))
+            legal_moves.assert_not_called()
+        # bumped by the start and the move
+        self.assertEqual(redis.jsonget('games', f'.{WAR}.{self.game_id}.version'), 2)
+        self.assertFalse(War.make_move(self.game_id, user, 'throw', 'XX'))
+        self.assertFalse(War.make_move(self.game_id, user, 'throw', ['2H']))
+
+    def test_possible_moves_room_without_version(self):
+        connect_to_game(WAR, self.game_id, self.user1_data)
+        connect_to_game(WAR, self.game_id, self.user2_data)
+        mark_ready(WAR, self.game_id, self.user1, True)
+        mark_ready(WAR, self.game_id, self.user2, True)
+        start_game(WAR, self.game_id)
+        # a room started before seeds and versions were stored
+        redis.jsondel('games', f'.{WAR}.{self.game_id}.seed')
+        redis.jsondel('games', f'.{WAR}.{self.game_id}.version')
+
+        user = current_username(WAR, self.game_id)
+        moves = possible_moves(WAR, self.game_id, user)
+        # reading the moves writes nothing
+        self.assertIsNone(redis.jsontype('games', f'.{WAR}.{self.game_id}.version'))
+        self.assertTrue(make_move(WAR, self.game_id, user, 'throw', moves['possible_moves'][0]))
+        self.assertEqual(redis.jsonget('games', f'.{WAR}.{self.game_id}.version'), 1)
+
+    def test_possible_moves_after_start(self):
+        connect_to_game(WAR, self.game_id, self.user1_data)
+        connect_to_game(WAR, self.game_id, self.user2_data)
+        self.assertEqual(redis.jsonget('games', f'.{WAR}.{self.game_id}.version'), 0)
+        self.assertEqual(possible_moves(WAR, self.game_id, self.user1)['possible_actions'], [])
+        self.assertEqual(possible_moves(WAR, self.game_id, self.user2)['possible_actions'], [])
+        mark_ready(WAR, self.game_id, self.user1, True)
+        mark_ready(WAR, self.game_id, self.user2, True)
+        start_game(WAR, self.game_id)
+
+        # the moves cached in the lobby are not served after the start
+        user = current_username(WAR, self.game_id)
+        self.assertEqual(possible_moves(WAR, self.game_id, user)['possible_actions'], ['throw'])
+
+    def test_move_out_of_turn(self):
+        connect_to_game(WAR, self.game_id, self.user1_data)
+        connect_to_game(WAR, self.game_id, self.user2_data)
+        mark_ready(WAR, self.game_id, self.user1, True)
+        mark_ready(WAR, self.game_id, self.user2, True)
+        start_game(WAR, self.game_id)
+
+        current = current_username(WAR, self.game_id)
+        other = self.user2 if current == self.user1 else self.user1
+        card = redis.jsonget('games', f'.{WAR}.{self.game_id}.players.'
+                             f'{game_self_info(WAR, self.game_id, other)["chair"]}.hand')[0]
+        self.assertEqual(possible_moves(WAR, self.game_id, other)['possible_actions'], [])
+        # rejected before the timers or any other write
+        with patch.object(War, 'check_timers') as check_timers:
+            self.assertFalse(make_move(WAR, self.game_id, other, 'throw', card))
+            check_timers.assert_not_called()
+        self.assertFalse(redis.jsonget('games', f'.{WAR}.{self.game_id}.state_to_send'))
+        self.assertEqual(redis.jsonget('games', f'.{WAR}.{self.game_id}.version'), 1)
+
+    def test_start_record(self):
+        connect_to_game(WAR, self.game_id, self.user1_data)
+        connect_to_game(WAR, self.game_id, self.user2_data)
+        mark_ready(WAR, self.game_id, self.user1, True)
+        mark_ready(WAR, self.game_id, self.user2, True)
+
+        if start_game_possible(WAR, self.game_id):
+            start_game(WAR, self.game_id)
+        game_info = redis.jsonget('games', f'.{WAR}.{self.game_id}')
+
+        record = War.start_record(self.game_id)
+        self.assertEqual(record['game_id'], self.game_id)
+        self.assertEqual(record['seed'], game_info['seed'])
+        self.assertNotIn('deck', record)
+        self.assertLess(len(json.dumps(record)), len(json.dumps(game_info)))
+
+        state = War.initial_state(record)
+        self.assertEqual(state['stack_draw'], game_info['stack_draw'])
+        self.assertEqual(state['current_player'], game_info['current_player'])
+        for chair, values in state['players'].items():
+            for key in ('id', 'hand', 'points', 'last_action'):
+                self.assertEqual(values[key], game_info['players'][chair][key])
+
+    @patch('games.write_behind.current_app.send_task')
+    def test_write_behind_flush(self, send_task):
+        connect_to_game(WAR, self.game_id, self.user1_data)
+        connect_to_game(WAR, self.game_id, self.user2_data)
+        mark_ready(WAR, self.game_id, self.user1, True)
+        mark_ready(WAR, self.game_id, self.user2, True)
+
+        if start_game_possible(WAR, self.game_id):
+            start_game(WAR, self.game_id)
+        user = current_username(WAR, self.game_id)
+        card = possible_moves(WAR, self.game_id, user)['possible_moves'][0]
+        make_move(WAR, self.game_id, user, 'throw', card)
+        surrender(WAR, self.game_id, self.user1)
+        send_task.assert_called_once()
+
+        self.assertEqual(Game.objects.get_by_gameroom_id(self.game_id).count(), 0)
+        flush_game(WAR, self.game_id)
+        self.assertEqual(redis.llen(queue_name(WAR, self.game_id)), 0)
+
+        game = Game.objects.get_by_gameroom_id(self.game_id).get()
+        participations = Participation.objects.filter(game=game)
+        self.assertEqual(participations.get(user=1).score, Participation.ScoreTypes.LOSE)
+        self.assertEqual(participations.get(user=2).score, Participation.ScoreTypes.WIN)
+        self.assertEqual(Move.objects.filter(participation__game=game).count(), 1)
+        self.assertEqual(PlayerStats.objects.get(user=1, game_type=self.gametype).losses, 1)
+        self.assertEqual(PlayerStats.objects.get(user=2, game_type=self.gametype).wins, 1)
+        chair = game_self_info(WAR, self.game_id, user)['chair']
+        self.assertEqual(list(game.moves()), [(chair, 'throw', card)])
+        self.assertEqual(
+            redis.jsonget('games', f'.{WAR}.{self.game_id}.participations'),
+            {str(p.user): p.pk for p in participations})
+
+    @patch('games.write_behind.current_app.send_task')
+    def test_write_behind_deleted_room(self, send_task):
+        enqueue(WAR, self.game_id, MOVE, user_id=1, action='take', move='', time=0)
+        delete_game(WAR, self.game_id)
+        dead = redis.llen(DEAD_LETTERS)
+
+        self.assertEqual(flush_game(WAR, self.game_id), 1)
+        self.assertEqual(redis.llen(queue_name(WAR, self.game_id)), 0)
+        self.assertEqual(redis.llen(DEAD_LETTERS), dead + 1)
+        self.assertEqual(json.loads(redis.rpop(DEAD_LETTERS))['game_id'], self.game_id)
+
     def test_update_rankings(self):
         connect_to_game(WAR, self.game_id, self.user1_data)
         connect_to_game(WAR, self.game_id, self.user2_data)
@@ -487,3 +742,361 @@ class RedisUtilsTests(TestCase):
     @patch('games.classes.game.redis.jsonget', side_effect=Exception())
     def test_redis_list_from_dict_exception(self, jsonget):
         self.assertEquals(redis_list_from_dict('smth', 'smth'), [])
+
+
+class LeaderboardTests(TestCase):
+    game = 'test_leaderboard'
+
+    def setUp(self):
+        for user_id, rating in [(1, 1000), (2, 1200), (3, 1100), (4, 900)]:
+            set_rating(self.game, user_id, rating, f'user{user_id}')
+
+    def tearDown(self):
+        redis.delete(leaderboard_name(self.game))
+        redis.hdel(NICKNAMES, 1, 2, 3, 4)
+
+    def test_top(self):
+        self.assertEqual([p['user'] for p in top(self.game, 2)], [2, 3])
+        self.assertEqual(top(self.game, 1)[0]['nickname'], 'user2')
+
+    def test_player_rank(self):
+        rank = player_rank(self.game, 1)
+        self.assertEqual(rank['position'], 3)
+        self.assertEqual(rank['rating'], 1000)
+        self.assertIsNone(player_rank(self.game, 5))
+
+    def test_around_rating(self):
+        players = around_rating(self.game, 1050, 1)
+        self.assertEqual([p['user'] for p in players], [3, 1])
+        self.assertEqual(players[0]['position'], 2)
+
+
+class PlayerStatsTests(TestCase):
+    def test_record_result_streaks(self):
+        stats = PlayerStats(user=1)
+        for score in [Participation.ScoreTypes.WIN, Participation.ScoreTypes.WIN,
+                      Participation.ScoreTypes.WIN_BY_DISCONNECT, Participation.ScoreTypes.LOSE,
+                      Participation.ScoreTypes.DRAW, Participation.ScoreTypes.LOSE_BY_DISCONNECT,
+                      Participation.ScoreTypes.LOSE]:
+            stats.record_result(score, 60)
+        self.assertEqual((stats.wins, stats.wins_by_disconnect, stats.draws), (2, 1, 1))
+        self.assertEqual((stats.losses, stats.losses_by_disconnect), (2, 1))
+        self.assertEqual(stats.best_streak, 3)
+        self.assertEqual(stats.current_streak, -2)
+        self.assertEqual(stats.average_time_sec, 60)
+
+
+class MoveLogTests(TestCase):
+    def test_pack_and_iterate(self):
+        moves = [('p1', 'take', None), ('p2', 'throw', '0H'), ('p1', 'throw', 'AS')]
+        packed = pack_moves(encode_move(*move) for move in moves)
+        self.assertEqual(len(packed), 1 + 3 * len(moves))
+        self.assertEqual(list(iter_moves(packed)), moves)
+        self.assertEqual(list(iter_moves(None)), [])
+
+
+class CardsTests(TestCase):
+    def test_codes(self):
+        self.assertEqual(card_code('2C'), 0)
+        self.assertEqual(card_code('AS'), 51)
+        self.assertEqual(to_strings(to_codes(['0H', 'QS'])), ['0H', 'QS'])
+        self.assertEqual(card_rank(card_code('0H')), cards_prefix.index('0'))
+
+    def test_compare_ranks(self):
+        self.assertEqual(compare_ranks(card_code('AS'), card_code('KH')), 1)
+        self.assertEqual(compare_ranks(card_code('2S'), card_code('2H')), 0)
+        self.assertEqual(compare_ranks(card_code('3D'), card_code('0C')), -1)
+
+    def test_mask(self):
+        codes = to_codes(['2C', '0H', 'AS'])
+        self.assertEqual(mask_codes(cards_mask(codes)), codes)
+        self.assertEqual(mask_codes(FULL_DECK_MASK), new_deck())
+
+    def test_shuffled_deck(self):
+        deck = shuffled_deck(random.Random(42))
+        self.assertEqual(deck, shuffled_deck(random.Random(42)))
+        self.assertNotEqual(deck, shuffled_deck(random.Random(43)))
+        self.assertEqual(sorted(deck), list(new_deck()))
+
+    def test_deal(self):
+        hands, deck, starting_player = deal(['p1', 'p2'], 3, 42)
+        self.assertEqual((hands, deck, starting_player), deal(['p1', 'p2'], 3, 42))
+        self.assertEqual(len(deck), 46)
+        self.assertEqual(list(hands['p1']), list(shuffled_deck(random.Random(42))[:-4:-1]))
+
+
+class WarEngineTests(TestCase):
+    def war_state(self, hands, stack_draw):
+        return WarState.from_room({
+            'game_parameters': {'max_players': 2},
+            'players': {
+                chair: {'id': i, 'nickname': f'user{i}', 'hand': hand, 'last_action': 'take'}
+                for i, (chair, hand) in enumerate(zip(('p1', 'p2'), hands), start=1)
+            },
+            'current_player': 'p1',
+            'stack_draw': stack_draw,
+            'stack_throw': [],
+        })
+
+    def throw(self, state, chair, card):
+        return state.apply(chair, 'throw', card_code(card))
+
+    def test_round(self):
+        state = self.war_state([['KS'], ['2H']], [])
+        self.assertEqual(state.legal_moves('p1'), [('throw', card_code('KS'))])
+        self.assertEqual(state.legal_moves(None), [])
+        self.assertFalse(state.apply(None, 'throw', card_code('KS')))
+        self.assertFalse(self.throw(state, 'p1', '2H'))
+        self.assertTrue(self.throw(state, 'p1', 'KS'))
+        self.assertEqual(state.current_player, 'p2')
+        self.assertTrue(self.throw(state, 'p2', '2H'))
+        self.assertEqual(state.players['p1'].points, 2)
+        self.assertEqual(len(state.stack_throw), 0)
+        self.assertTrue(state.is_finished())
+        self.assertFalse(state.apply('p1', 'take'))
+
+    def test_lobby_not_finished(self):
+        lobby = {
+            'game_parameters': {'max_players': 2},
+            'players': {'p1': {'id': 1, 'nickname': 'user1'}},
+            'status': WAITING,
+        }
+        for state_class in (WarState, MakaoState):
+            self.assertFalse(state_class.from_room(lobby).is_finished())
+            self.assertTrue(state_class.from_room(dict(lobby, status=FINISHED)).is_finished())
+
+    def test_out_of_turn(self):
+        state = self.war_state([['KS'], ['2H']], [])
+        self.assertEqual(state.legal_moves('p2'), [])
+        self.assertFalse(self.throw(state, 'p2', '2H'))
+        self.assertEqual(list(state.players['p2'].hand), [card_code('2H')])
+        self.assertEqual(state.current_player, 'p1')
+
+    def test_take_after_throw(self):
+        state = self.war_state([['KS'], ['2H']], ['5D', '6D'])
+        self.throw(state, 'p1', 'KS')
+        self.assertEqual(state.legal_moves('p1'), [('take', None)])
+        self.assertTrue(state.apply('p1', 'take'))
+        self.assertEqual(len(state.players['p1'].hand), 1)
+        self.assertEqual(state.current_player, 'p2')
+
+    def test_war_event(self):
+        state = self.war_state([['KS', '3C', '4C'], ['KH', '2C', '5C']], [])
+        for chair, card in [('p1', 'KS'), ('p2', 'KH'), ('p1', '3C'), ('p2', '2C')]:
+            self.throw(state, chair, card)
+        # the round after equal cards is thrown blind
+        self.assertTrue(state.war_event)
+        self.assertEqual(len(state.stack_throw), 4)
+        self.throw(state, 'p1', '4C')
+        self.throw(state, 'p2', '5C')
+        self.assertEqual(state.players['p2'].points, 6)
+
+    def test_replay(self):
+        moves = [('p1', 'throw', 'KS'), ('p1', 'take', None), ('p2', 'throw', '2H')]
+        state = self.war_state([['KS'], ['2H']], ['5D', '6D'])
+        applied = [applied for *_, applied in replay(state, moves)]
+        self.assertEqual(applied, [True, True, True])
+        self.assertEqual(state.players['p1'].points, 2)
+
+        state = state_at(self.war_state([['KS'], ['2H']], ['5D', '6D']), moves, 0)
+        self.assertEqual(to_strings(state.stack_throw), ['KS'])
+        state = state_at(self.war_state([['KS'], ['2H']], ['5D', '6D']), moves, -1)
+        self.assertEqual(len(state.stack_throw), 0)
+
+    def test_replay_wrong_move(self):
+        state = self.war_state([['KS'], ['2H']], [])
+        applied = [applied for *_, applied in replay(state, [('p1', 'throw', 'AS')])]
+        self.assertEqual(applied, [False])
+
+    def test_room_roundtrip(self):
+        state = self.war_state([['KS'], ['2H']], ['5D'])
+        self.throw(state, 'p1', 'KS')
+        room = state.to_room()
+        self.assertEqual(room['stack_throw'], ['KS'])
+        self.assertEqual(room['players']['p1'], {'hand': [], 'points': 0, 'last_action': 'throw'})
+        self.assertNotIn('status', room)
+
+    @patch('games.engine.store.redis.pipeline')
+    def test_save_take(self, pipeline):
+        state = self.war_state([['KS'], ['2H']], ['5D', '6D'])
+        self.throw(state, 'p1', 'KS')
+        state.source = state.to_room()
+        state.apply('p1', 'take')
+        save_state(War, 'g1', state)
+        pipe = pipeline.return_value
+        # the taken card is trimmed and appended, not the whole lists written
+        pipe.jsonarrtrim.assert_called_once_with('games', '.war.g1.stack_draw', 0, 0)
+        pipe.jsonarrappend.assert_called_once_with('games', '.war.g1.players.p1.hand', '6D')
+        self.assertNotIn('.war.g1.stack_draw',
+                         [call.args[1] for call in pipe.jsonset.call_args_list])
+
+
+class MakaoEngineTests(TestCase):
+    def makao_state(self, hands, top, stack_draw=(), **params):
+        params['max_players'] = len(hands)
+        return MakaoState.from_room({
+            'game_parameters': params,
+            'players': {
+                f'p{i}': {'id': i, 'nickname': f'user{i}', 'hand': hand}
+                for i, hand in enumerate(hands, start=1)
+            },
+            'current_player': 'p1',
+            'stack_draw': list(stack_draw),
+            'stack_throw': [top],
+        })
+
+    def throws(self, state):
+        return to_strings(move for action, move in state.legal_moves(state.current_player) if action == 'throw')
+
+    def test_match(self):
+        state = self.makao_state([['7H', '9H', '7S', 'QC', '5D'], ['6C']], '7C')
+        self.assertEqual(self.throws(state), ['7H', '7S', 'QC'])
+        self.assertEqual(state.legal_moves(state.current_player)[-1], ('take', None))
+        self.assertEqual(self.throws(self.makao_state(
+            [['7H', '5D'], ['6C']], 'QC', all_on_queen=True)), ['7H', '5D'])
+        self.assertEqual(self.throws(self.makao_state(
+            [['QC'], ['6C']], '7H', queen_on_all=False)), [])
+        self.assertFalse(state.apply('p1', 'throw', card_code('9H')))
+        self.assertFalse(state.apply('p2', 'throw', card_code('6C')))
+
+    def test_same_rank_in_turn(self):
+        state = self.makao_state([['7H', '7S', '9D'], ['6C']], '7C')
+        self.assertTrue(state.apply('p1', 'throw', card_code('7H')))
+        self.assertEqual(state.legal_moves(state.current_player), [('throw', card_code('7S')), ('end', None)])
+        self.assertTrue(state.apply('p1', 'throw', card_code('7S')))
+        self.assertEqual(state.current_player, 'p2')
+
+    def test_penalty(self):
+        state = self.makao_state([['2C', '5D'], ['2D', '6H'], ['8H']], '9C',
+                                 ['5H', '6D', '7D', '8D', '9D'])
+        state.apply('p1', 'throw', card_code('2C'))
+        self.assertEqual(self.throws(state), ['2D'])
+        state.apply('p2', 'throw', card_code('2D'))
+        self.assertEqual(state.penalty, 4)
+        self.assertTrue(state.apply('p3', 'take'))
+        self.assertEqual(len(state.players['p3'].hand), 5)
+        self.assertEqual((state.penalty, state.current_player), (0, 'p1'))
+
+    def test_king_of_spades_goes_back(self):
+        state = self.makao_state([['KS', '5D'], ['6H'], ['8H']], '9S')
+        state.apply('p1', 'throw', card_code('KS'))
+        self.assertEqual(state.current_player, 'p3')
+
+    def test_wait(self):
+        state = self.makao_state([['4C', '5D'], ['6H', '7H'], ['8H']], '9C', ['5H', '6D'])
+        state.apply('p1', 'throw', card_code('4C'))
+        self.assertEqual(state.legal_moves(state.current_player), [('end', None)])
+        state.apply('p2', 'end')
+        self.assertEqual(state.current_player, 'p3')
+        state.apply('p3', 'take')
+        self.assertEqual(state.current_player, 'p1')
+        # the one turn to wait was the end above
+        state.apply('p1', 'take')
+        self.assertEqual(state.current_player, 'p2')
+
+    def test_demands(self):
+        state = self.makao_state([['JC', '7D', '5D'], ['7H', '8H'], ['7S']], '9C')
+        state.apply('p1', 'throw', card_code('JC'))
+        self.assertIn(('demand', card_code('7C')), state.legal_moves(state.current_player))
+        state.apply('p1', 'demand', card_code('7C'))
+        self.assertEqual(self.throws(state), ['7H'])
+        state.apply('p2', 'throw', card_code('7H'))
+        self.assertEqual(self.throws(state), ['7S'])
+
+        state = self.makao_state([['AC', '7D', '5D'], ['7H', '8D']], '9C')
+        state.apply('p1', 'throw', card_code('AC'))
+        state.apply('p1', 'demand', card_code('AD'))
+        self.assertEqual(self.throws(state), ['8D'])
+
+    def test_starting_pile(self):
+        deck = to_codes(['5D', '2C', 'JH'])
+        self.assertEqual(card_from_code(starting_pile(deck)), '5D')
+        self.assertEqual(to_strings(deck), ['JH', '2C'])
+        # only function cards left: the last one is used
+        deck = to_codes(['2C', 'JH'])
+        self.assertEqual(card_from_code(starting_pile(deck)), '2C')
+        self.assertEqual(to_strings(deck), ['JH'])
+        self.assertIsNone(starting_pile(to_codes([])))
+
+    def test_not_seated(self):
+        state = self.makao_state([['7H'], ['6C']], '7C')
+        self.assertEqual(state.legal_moves(None), [])
+        self.assertFalse(state.apply(None, 'throw', card_code('7H')))
+
+    def test_random_games(self):
+        for seed in range(20):
+            hands, deck, _ = deal(['p1', 'p2', 'p3'], 5, seed)
+            top = starting_pile(deck)
+            state = self.makao_state([to_strings(hand) for hand in hands.values()],
+                                     card_from_code(top), to_strings(deck))
+            rng = random.Random(seed)
+            for _ in range(200):
+                if state.is_finished():
+                    break
+                action, move = rng.choice(state.legal_moves(state.current_player))
+                self.assertTrue(state.apply(state.current_player, action, move))
+            cards = list(state.stack_draw) + list(state.stack_throw) + [
+                card for player in state.players.values() for card in player.hand]
+            self.assertEqual(cards_mask(cards), FULL_DECK_MASK)
+            self.assertEqual(len(cards), 52)
+
+
+class WarSimulatorTests(TestCase):
+    def test_all_cards_counted(self):
+        for policy in ('random', 'highest'):
+            results = simulate(500, 3, policy, seed=1)
+            self.assertTrue(all(results['points'].sum(axis=0) + results['unscored'] == 52))
+
+    def test_seeded(self):
+        first, second = simulate(200, 5, seed=7), simulate(200, 5, seed=7)
+        self.assertTrue((first['points'] == second['points']).all())
+
+    def test_summary(self):
+        stats = summarize(simulate(1000, 1, seed=1), 1)
+        self.assertEqual(stats['games'], 1000)
+        self.assertEqual(stats['moves'], 102)
+        self.assertTrue(0 < stats['draw_rate'] < 1)
+
+    def test_two_players_only(self):
+        with self.assertRaises(ValueError):
+            simulate(10, 3, players=4)
+
+
+class MessageCodecTests(TestCase):
+    def setUp(self):
+        self.game_data = {
+            'game_type': WAR,
+            'players': {
+                '1': {'points': 10, 'score': 'win', 'left': False, 'moves': 25, 'time_sec': 100},
+                '2': {'points': -10, 'score': 'lose', 'left': True, 'moves': 24, 'time_sec': 20},
+            }
+        }
+        self.ranking_request = {'game_type': WAR, 'game_id': 'g1234', 'players': [1, 2]}
+        self.user_data = {
+            'game_name': WAR,
+            'game_id': 'g1234',
+            'players': {'1': {'nickname': 'user1', 'rank': 1200}},
+        }
+
+    def test_msgpack_roundtrip(self):
+        for jsonbody, kind in [(self.game_data, GAME_DATA),
+                               (self.ranking_request, RANKING_REQUEST),
+                               (self.user_data, USER_DATA)]:
+            body, content_type = encode_message(jsonbody, kind, 'msgpack')
+            self.assertEqual(content_type, MSGPACK_CONTENT_TYPE)
+            self.assertLess(len(body), len(json.dumps(jsonbody)))
+            self.assertEqual(decode_message(body, content_type), jsonbody)
+
+    def test_json_by_default(self):
+        body, content_type = encode_message(self.game_data, GAME_DATA)
+        self.assertEqual(content_type, JSON_CONTENT_TYPE)
+        self.assertEqual(json.loads(body), self.game_data)
+
+    def test_decode_legacy_json(self):
+        body = json.dumps(self.user_data).encode()
+        self.assertEqual(decode_message(body), self.user_data)
+
+    @patch('games.rabbimq.codec.msgpack.unpackb', return_value=[SCHEMA_VERSION + 1, GAME_DATA])
+    def test_decode_unknown_version(self, unpackb):
+        with self.assertRaises(ValueError):
+            decode_message(b'\x92')
@@ -8,7 +8,16 @@ urlpatterns = [
     path('<str:game_name>/info/', views.game_info, name='game_info'),
     path('<str:game_name>/lobby/create/', views.game_create, name='game_create'),
     path('<str:game_name>/lobby/list/', views.game_lobbies, name='game_lobbie'),
+    path('<str:game_name>/leaderboard/', views.leaderboard_top, name='leaderboard_top'),
+    path('<str:game_name>/leaderboard/around/', views.leaderboard_around,
+         name='leaderboard_around'),
+    path('<str:game_name>/leaderboard/<int:user_id>/', views.leaderboard_player,
+         name='leaderboard_player'),
     path('<str:game_name>/<str:game_id>/info/', views.lobby_info, name='lobby_info'),
+    path('history/', views.game_history, name='game_history'),
+    path('history/user/<int:user_id>/', views.user_history, name='user_history'),
+    path('history/<int:game_pk>/replay/', views.game_replay, name='game_replay'),
+    path('stats/<int:user_id>/', views.user_stats, name='user_stats'),
     path('saml/', views.saml_view, name='saml_view'),
     path('metadata/', views.metadata, name='metadata'),
 ]
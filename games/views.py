@@ -1,11 +1,18 @@
 from datetime import datetime
+import base64
 from django.shortcuts import render
 from django.conf import settings
 from django.urls import reverse
 from django.http import JsonResponse, HttpResponseNotFound, HttpResponseBadRequest
 from django.http import HttpResponse, HttpResponseRedirect, HttpResponseServerError
+from django.http import StreamingHttpResponse, HttpResponseNotModified
+from django.utils.dateparse import parse_datetime
+from django.db.models import F
 from .classes.games_handler import create_game
-from .models import GameType
+from .registry import get_config
+from .models import GameType, Game, PlayerStats
+from .replay import replay_events
+from . import leaderboard
 from .resources import normalize_str
 from .redis_utils import redis, redis_list_from_dict, redis_game_info
 import json
@@ -18,6 +25,10 @@ from onelogin.saml2.response import OneLogin_Saml2_Response
 
 
 SAML_SESSION_EXPIRE = 10
+LEADERBOARD_SIZE = 10
+LEADERBOARD_MAX_SIZE = 100
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
 
 
 def init_saml_auth(req):
@@ -66,22 +77,29 @@ def lobby_info(request, game_name, game_id):
 
 
 def game_info(request, game_name):
-    for typegame in list(GameType.objects.all().values('type_name', 'description')):
-        if normalize_str(typegame['type_name']).lower() == game_name:
-            typegame['name'] = game_name
-            return JsonResponse(typegame, safe=False)
-    return HttpResponseNotFound("Game does not exist")
+    typegame = GameType.objects.get_typegame_lower_nospecial(game_name)
+    if typegame is None:
+        return HttpResponseNotFound("Game does not exist")
+    return JsonResponse({
+        'type_name': typegame.type_name,
+        'description': typegame.description,
+        'name': game_name,
+    })
 
 
 @ensure_csrf_cookie
 def game_create(request, game_name):
     if request.method == 'GET':
         try:
-            with open(f'games/games_configs/{game_name}.json') as json_file:
-                data = json.load(json_file)
-            return JsonResponse(data)
+            config = get_config(game_name)
         except:
             return HttpResponseNotFound("Game does not exist")
+        if request.headers.get('If-None-Match') == config.etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(config.body, content_type='application/json')
+        response['ETag'] = config.etag
+        return response
     elif request.method == 'POST':
         # CREATE GAME
         try:
@@ -92,6 +110,121 @@ def game_create(request, game_name):
     return JsonResponse({})
 
 
+def game_replay(request, game_pk):
+    # one JSON event per line, moves are read before the response streams
+    try:
+        game = Game.objects.select_related('game_type').get(pk=game_pk)
+    except Game.DoesNotExist:
+        return HttpResponseNotFound("Game does not exist")
+    events = (json.dumps(event) + '\n' for event in replay_events(game))
+    return StreamingHttpResponse(events, content_type='application/x-ndjson')
+
+
+def encode_history_cursor(game):
+    cursor = f"{game['datetime'].isoformat()}|{game['pk']}"
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_history_cursor(cursor):
+    datetime, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return parse_datetime(datetime), int(pk)
+
+
+def history_page(request, queryset, fields):
+    """
+    Filters by ?game_type=&after=&before= and returns one keyset page,
+    the next page is requested with ?cursor=<next>
+    """
+    params = request.GET
+    if 'game_type' in params:
+        gametype = GameType.objects.get_typegame_lower_nospecial(
+            params['game_type'])
+        if gametype is None:
+            raise ValueError('Game does not exist')
+        queryset = queryset.filter(game_type=gametype)
+    if 'after' in params:
+        queryset = queryset.filter(datetime__gte=parse_datetime(params['after']))
+    if 'before' in params:
+        queryset = queryset.filter(datetime__lt=parse_datetime(params['before']))
+    cursor = None
+    if 'cursor' in params:
+        cursor = decode_history_cursor(params['cursor'])
+    limit = int(params.get('limit', HISTORY_PAGE_SIZE))
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        raise ValueError('Incorrect limit')
+
+    games = list(queryset.get_page(cursor, limit).values(*fields))
+    next_cursor = None
+    if len(games) == limit:
+        next_cursor = encode_history_cursor(games[-1])
+    for game in games:
+        game['game_type'] = game.pop('game_type__type_name')
+        game['datetime'] = game['datetime'].isoformat()
+    return {'games': games, 'next': next_cursor}
+
+
+def game_history(request):
+    try:
+        page = history_page(request, Game.objects.all(),
+                            ['pk', 'datetime', 'game_type__type_name'])
+    except (ValueError, TypeError):
+        return HttpResponseBadRequest("Incorrect history query")
+    return JsonResponse(page)
+
+
+def user_history(request, user_id):
+    queryset = Game.objects.get_user_games(user_id).annotate(
+        score=F('participation__score'))
+    try:
+        page = history_page(request, queryset,
+                            ['pk', 'datetime', 'game_type__type_name', 'score'])
+    except (ValueError, TypeError):
+        return HttpResponseBadRequest("Incorrect history query")
+    return JsonResponse(page)
+
+
+def user_stats(request, user_id):
+    stats = PlayerStats.objects.get_user_stats(user_id).select_related('game_type')
+    if 'game_type' in request.GET:
+        gametype = GameType.objects.get_typegame_lower_nospecial(
+            request.GET['game_type'])
+        if gametype is None:
+            return HttpResponseNotFound("Game does not exist")
+        stats = stats.filter(game_type=gametype)
+    return JsonResponse({'stats': [row.to_dict() for row in stats]})
+
+
+def leaderboard_top(request, game_name):
+    try:
+        count = min(int(request.GET.get('limit', LEADERBOARD_SIZE)),
+                    LEADERBOARD_MAX_SIZE)
+    except ValueError:
+        return HttpResponseBadRequest("Incorrect limit")
+    if count < 1:
+        # a zero or negative stop would read the whole sorted set
+        return HttpResponseBadRequest("Incorrect limit")
+    return JsonResponse({'players': leaderboard.top(game_name, count)})
+
+
+def leaderboard_player(request, game_name, user_id):
+    rank = leaderboard.player_rank(game_name, user_id)
+    if rank is None:
+        return HttpResponseNotFound("Player has no rating")
+    return JsonResponse(rank)
+
+
+def leaderboard_around(request, game_name):
+    try:
+        rating = float(request.GET['rating'])
+        count = min(int(request.GET.get('count', LEADERBOARD_SIZE // 2)),
+                    LEADERBOARD_MAX_SIZE)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("Incorrect rating")
+    if count < 1:
+        return HttpResponseBadRequest("Incorrect count")
+    return JsonResponse({'players': leaderboard.around_rating(game_name, rating, count)})
+
+
 def saml_view(request):
 
     req = prepare_django_request(request)
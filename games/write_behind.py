@@ -0,0 +1,182 @@
+import json
+import base64
+from datetime import datetime, timezone
+from celery import current_app
+from django.db import transaction
+from redis.exceptions import ResponseError
+from .models import GameType, Game, Participation, Move, PlayerStats
+from .redis_utils import redis
+
+# Database writes of running games are queued in Redis (one list per game,
+# so ordering per game is kept) and flushed to PostgreSQL by celery:
+# periodically by the `flush_write_behind` beat task and right away when
+# a game ends. A game whose queue reaches FLUSH_THRESHOLD ops is flushed
+# without waiting for the beat. Moves are inserted with bulk_create.
+# Participation pks created by a start_game op are stored in the room
+# (`participations`: {user_id: pk}) and every later write targets them.
+# Ops of a room deleted before its queue was flushed have no
+# participations to target, they are moved to DEAD_LETTERS.
+QUEUE_PREFIX = 'writebehind'
+PENDING_GAMES = f'{QUEUE_PREFIX}:games'
+DEAD_LETTERS = f'{QUEUE_PREFIX}:dead'
+LOCK_TIMEOUT = 60
+FLUSH_THRESHOLD = 200
+MOVES_BATCH_SIZE = 500
+
+START_GAME = 'start_game'
+MOVE = 'move'
+FINISH = 'finish'
+RATINGS = 'ratings'
+
+
+def queue_name(game_type, game_id):
+    return f'{QUEUE_PREFIX}:{game_type}:{game_id}'
+
+
+def enqueue(game_type, game_id, op, flush=False, **payload):
+    payload['op'] = op
+    length = redis.rpush(queue_name(game_type, game_id), json.dumps(payload))
+    redis.sadd(PENDING_GAMES, f'{game_type}:{game_id}')
+    if flush or length % FLUSH_THRESHOLD == 0:
+        current_app.send_task('games.tasks.flush_game_writes',
+                              args=(game_type, game_id))
+
+
+def has_pending_writes(game_type, game_id):
+    return redis.llen(queue_name(game_type, game_id)) > 0
+
+
+def pending_games():
+    return [member.split(':', 1) for member in redis.smembers(PENDING_GAMES)]
+
+
+def flush_game(game_type, game_id):
+    """
+    Applies all queued writes of a game in one transaction.
+    On failure nothing is removed from the queue and the next flush retries.
+    """
+    name = queue_name(game_type, game_id)
+    lock = redis.lock(f'{name}:lock', timeout=LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        ops = [json.loads(op) for op in redis.lrange(name, 0, -1)]
+        if ops:
+            with transaction.atomic():
+                apply_ops(game_type, game_id, ops)
+            redis.ltrim(name, len(ops), -1)
+        # enqueue pushes before marking the game as pending,
+        # so anything pushed meanwhile is seen by llen
+        redis.srem(PENDING_GAMES, f'{game_type}:{game_id}')
+        if redis.llen(name):
+            redis.sadd(PENDING_GAMES, f'{game_type}:{game_id}')
+        return len(ops)
+    finally:
+        lock.release()
+
+
+def flush_all():
+    flushed = 0
+    for game_type, game_id in pending_games():
+        try:
+            flushed += flush_game(game_type, game_id)
+        except Exception as err:
+            print(f"Unexpected {err=}, {type(err)=}")
+    return flushed
+
+
+def load_participations(game_type, game_id):
+    try:
+        return redis.jsonget('games', f'.{game_type}.{game_id}.participations')
+    except ResponseError:
+        # the room was deleted
+        return None
+
+
+def dead_letter(game_type, game_id, op):
+    print(f'Dropping {op["op"]} of {game_type}:{game_id}, no participations')
+    redis.rpush(DEAD_LETTERS, json.dumps(
+        {'game_type': game_type, 'game_id': game_id, **op}))
+
+
+def save_participations(game_type, game_id, participations):
+    # written before commit: if the flush fails the start_game op stays
+    # queued and overwrites this again before any op that reads it
+    try:
+        redis.jsonset('games', f'.{game_type}.{game_id}.participations',
+                      participations)
+    except ResponseError:
+        # the room was deleted, later ops of this flush use the returned dict
+        pass
+
+
+def apply_ops(game_type, game_id, ops):
+    # str(user_id) -> Participation pk of the game currently being written
+    participations = None
+    moves = []
+    for op in ops:
+        if op['op'] == START_GAME:
+            persist_moves(moves)
+            moves = []
+            participations = apply_start_game(game_type, op)
+            save_participations(game_type, game_id, participations)
+            continue
+        if op['op'] == RATINGS:
+            apply_ratings(game_type, op)
+            continue
+        if participations is None:
+            participations = load_participations(game_type, game_id)
+        if participations is None:
+            dead_letter(game_type, game_id, op)
+        elif op['op'] == MOVE:
+            moves.append(Move(participation_id=participations[str(op['user_id'])],
+                              action=op['action'], move=op['move'],
+                              datetime=datetime.fromtimestamp(op['time'], timezone.utc)))
+        elif op['op'] == FINISH:
+            # queued moves go in before the final scores
+            persist_moves(moves)
+            moves = []
+            apply_finish(game_type, participations, op)
+    persist_moves(moves)
+
+
+def apply_start_game(game_type, op):
+    modeltype = GameType.objects.get_typegame_lower_nospecial(game_type)
+    modelgame = Game.objects.create(game_type=modeltype,
+                                    start_state=op['start_state'])
+    created = Participation.objects.bulk_create([
+        Participation(user=player_id,
+                      game=modelgame,
+                      score=Participation.ScoreTypes.IN_PROGRESS)
+        for player_id in op['players']
+    ])
+    return {str(partic.user): partic.pk for partic in created}
+
+
+def persist_moves(moves):
+    if moves:
+        Move.objects.bulk_create(moves, batch_size=MOVES_BATCH_SIZE)
+
+
+def apply_finish(game_type, participations, op):
+    modeltype = GameType.objects.get_typegame_lower_nospecial(game_type)
+    for user_id, score in op['scores'].items():
+        Participation.objects.filter(
+            pk=participations[str(user_id)]).update(score=score)
+        stats = PlayerStats.objects.get_for_update(int(user_id), modeltype)
+        stats.record_result(score, op['times'][user_id])
+        stats.save()
+    Game.objects.filter(
+        participation__pk=next(iter(participations.values()))
+    ).update(move_log=base64.b64decode(op['move_log']))
+
+
+def apply_ratings(game_type, op):
+    modeltype = GameType.objects.get_typegame_lower_nospecial(game_type)
+    for user_id, rating in op['ratings'].items():
+        stats = PlayerStats.objects.get_for_update(int(user_id), modeltype)
+        stats.rating = round(rating)
+        params = op.get('params', {}).get(user_id, {})
+        stats.rating_deviation = params.get('deviation')
+        stats.rating_volatility = params.get('volatility')
+        stats.save(update_fields=['rating', 'rating_deviation', 'rating_volatility'])
@@ -18,6 +18,10 @@ app.conf.beat_schedule = {
         'task': 'games.tasks.is_alive',
         'schedule': 1,
     },
+    'flush_write_behind': {
+        'task': 'games.tasks.flush_write_behind',
+        'schedule': 5,
+    },
     'delete_empty_lobbies': {
         'task': 'games.tasks.delete_empty_lobbies',
         'schedule': 300,
@@ -149,6 +149,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REDIS_HOST = os.environ.get('REDIS_HOST')
 REDIS_PORT = os.environ.get('REDIS_PORT')
 
+# Besides the packed Game.move_log, write one Move row per action
+# (admin Move inlines and move history read them)
+STORE_MOVE_ROWS = os.environ.get('STORE_MOVE_ROWS', 'true') == 'true'
+
+# games.ranking.ENGINES: 'elo' or 'glicko2'
+RATING_ENGINE = os.environ.get('RATING_ENGINE', 'elo')
+
+# Game type name -> Game subclass, imported on first use (games.registry).
+# Installed packages can add types with 'gameserver.games' entry points.
+GAME_TYPES = {
+    'war': 'games.classes.war.War',
+    'makao': 'games.classes.makao.Makao',
+}
+
 ASGI_APPLICATION = 'gameserver.asgi.application'
 CHANNEL_LAYERS = {
     'default': {